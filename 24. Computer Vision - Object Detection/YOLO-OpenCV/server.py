@@ -0,0 +1,94 @@
+import os
+import queue
+import asyncio
+import argparse
+import time
+from typing import List
+
+import numpy as np
+import cv2 as cv
+from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from yolo_utils import infer_image, load_net, detection_records
+
+# Configuration is read from the environment so every uvicorn worker loads the same model
+CONFIG = os.environ.get('YOLO_CONFIG', './yolov3-coco/yolov3.cfg')
+WEIGHTS = os.environ.get('YOLO_WEIGHTS', './yolov3-coco/yolov3.weights')
+LABELS = os.environ.get('YOLO_LABELS', './yolov3-coco/coco-labels')
+POOL_SIZE = int(os.environ.get('YOLO_POOL_SIZE', os.cpu_count() or 1))
+
+FLAGS = argparse.Namespace(
+    confidence=float(os.environ.get('YOLO_CONFIDENCE', 0.5)),
+    threshold=float(os.environ.get('YOLO_THRESHOLD', 0.3)),
+    input_size=int(os.environ.get('YOLO_INPUT_SIZE', 416)),
+    show_time=False)
+
+
+class NetPool:
+    """Fixed set of Darknet nets, each running at most one forward pass at a time."""
+
+    def __init__(self, config, weights, size):
+        # Every net gets a single OpenCV thread, the pool supplies the parallelism
+        if size > 1:
+            cv.setNumThreads(1)
+
+        self.size = size
+        self._nets = queue.Queue()
+        for _ in range(size):
+            self._nets.put(load_net(config, weights))
+
+    def detect(self, img, labels):
+        height, width = img.shape[:2]
+
+        net, layer_names = self._nets.get()
+        try:
+            _, boxes, confidences, classids, idxs = infer_image(net, layer_names, height, width,
+                                                                img, None, labels, FLAGS, draw=False)
+        finally:
+            self._nets.put((net, layer_names))
+
+        return list(detection_records(boxes, confidences, classids, idxs, labels))
+
+
+app = FastAPI()
+labels = None
+pool = None
+
+
+@app.on_event('startup')
+def load_model():
+    # Runs once per worker process
+    global labels, pool
+    labels = open(LABELS).read().strip().split('\n')
+    pool = NetPool(CONFIG, WEIGHTS, POOL_SIZE)
+
+
+async def detect_upload(upload):
+    img = cv.imdecode(np.frombuffer(await upload.read(), np.uint8), cv.IMREAD_COLOR)
+    if img is None:
+        raise HTTPException(status_code=400, detail='{} is not a readable image'.format(upload.filename))
+
+    start = time.time()
+    detections = await run_in_threadpool(pool.detect, img, labels)
+    return {'filename': upload.filename, 'width': img.shape[1], 'height': img.shape[0],
+            'detections': detections, 'seconds': time.time() - start}
+
+
+@app.get('/health')
+def health():
+    return {'status': 'ok', 'nets': pool.size if pool else 0}
+
+
+@app.post('/detect')
+async def detect(file: UploadFile = File(...)):
+    return await detect_upload(file)
+
+
+@app.post('/detect/batch')
+async def detect_batch(files: List[UploadFile] = File(...)):
+    # Images are spread over the free nets of the pool
+    return await asyncio.gather(*[detect_upload(f) for f in files])
+
+# Run the server
+# uvicorn server:app --host 0.0.0.0 --port 8000 --workers 1
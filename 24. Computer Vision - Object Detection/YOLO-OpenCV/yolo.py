@@ -4,7 +4,7 @@ import cv2 as cv
 import subprocess
 import time
 import os
-from yolo_utils import infer_image, show_image
+from yolo_utils import infer_image, show_image, load_net, DetectionWriter, StageTimer
 
 FLAGS = []
 
@@ -72,8 +72,33 @@ if __name__ == '__main__':
 		default=False,
 		help='Show the time taken to infer each image.')
 
+	parser.add_argument('-s', '--input-size',
+		type=int,
+		default=416,
+		choices=[320, 416, 608],
+		help='The resolution of the blob fed to the network. \
+				Smaller is faster, larger is more accurate. default: 416')
+
+	parser.add_argument('-p', '--profile',
+		action='store_true',
+		help='Time blob creation, forward pass, decode, NMS and drawing \
+				separately and print a mean/p95 summary at the end of the run.')
+
+	parser.add_argument('--profile-path',
+		type=str,
+		help='Also write the profiling summary as JSON to this file.')
+
+	parser.add_argument('-e', '--export-path',
+		type=str,
+		help='Write detections (frame, class, confidence, box) to this \
+				.jsonl or .parquet file instead of drawing, showing \
+				or re-encoding frames.')
+
 	FLAGS, unparsed = parser.parse_known_args()
 
+	if FLAGS.export_path and FLAGS.image_path is None and FLAGS.video_path is None:
+		parser.error('--export-path needs an --image-path or a --video-path')
+
 	# Download the YOLOv3 models if needed
 	if FLAGS.download_model:
 		subprocess.call(['./yolov3-coco/get_model.sh'])
@@ -84,20 +109,61 @@ if __name__ == '__main__':
 	# Intializing colors to represent each label uniquely
 	colors = np.random.randint(0, 255, size=(len(labels), 3), dtype='uint8')
 
-	# Load the weights and configutation to form the pretrained YOLOv3 model
-	net = cv.dnn.readNetFromDarknet(FLAGS.config, FLAGS.weights)
-
-	# Get the output layer names of the model
-	layer_names = net.getLayerNames()
-	layer_names = [layer_names[i - 1] for i in net.getUnconnectedOutLayers()]
+	# Load the pretrained YOLOv3 model and its output layer names
+	net, layer_names = load_net(FLAGS.config, FLAGS.weights)
         
 	# If both image and video files are given then raise error
 	if FLAGS.image_path is None and FLAGS.video_path is None:
 	    print ('Neither path to an image or path to video provided')
 	    print ('Starting Inference on Webcam')
 
+	# Collect per-stage timings if profiling is requested
+	timer = StageTimer(FLAGS.input_size) if FLAGS.profile or FLAGS.profile_path else None
+
+	# Headless export: only detect and stream the results, no drawing or encoding
+	if FLAGS.export_path:
+		start = time.time()
+		frame_idx = 0
+
+		with DetectionWriter(FLAGS.export_path) as exporter:
+			if FLAGS.image_path:
+				img = cv.imread(FLAGS.image_path)
+				height, width = img.shape[:2]
+
+				_, boxes, confidences, classids, idxs = infer_image(net, layer_names, \
+									height, width, img, colors, labels, FLAGS, draw=False, timer=timer)
+				exporter.write(frame_idx, boxes, confidences, classids, idxs, labels)
+				frame_idx += 1
+			else:
+				vid = cv.VideoCapture(FLAGS.video_path)
+				height, width = None, None
+
+				while True:
+					grabbed, frame = vid.read()
+
+					# Checking if the complete video is read
+					if not grabbed:
+						break
+
+					if width is None or height is None:
+						height, width = frame.shape[:2]
+
+					_, boxes, confidences, classids, idxs = infer_image(net, layer_names, \
+										height, width, frame, colors, labels, FLAGS, draw=False, timer=timer)
+					exporter.write(frame_idx, boxes, confidences, classids, idxs, labels)
+					frame_idx += 1
+
+				vid.release()
+
+		elapsed = time.time() - start
+		print ('[INFO] Exported {} detections from {} frames to {} ({:.2f} frames/sec)'.format(
+			exporter.count, frame_idx, FLAGS.export_path, frame_idx / max(elapsed, 1e-9)))
+
+		if timer is not None:
+			timer.report(FLAGS.profile_path)
+
 	# Do inference with given image
-	if FLAGS.image_path:
+	elif FLAGS.image_path:
 		# Read the image
 		try:
 			img = cv.imread(FLAGS.image_path)
@@ -107,7 +173,9 @@ if __name__ == '__main__':
                                Please check the path provided!'
 
 		finally:
-			img, _, _, _, _ = infer_image(net, layer_names, height, width, img, colors, labels, FLAGS)
+			img, _, _, _, _ = infer_image(net, layer_names, height, width, img, colors, labels, FLAGS, timer=timer)
+			if timer is not None:
+				timer.report(FLAGS.profile_path)
 			show_image(img)
 
 	elif FLAGS.video_path:
@@ -131,7 +199,7 @@ if __name__ == '__main__':
 				if width is None or height is None:
 					height, width = frame.shape[:2]
 
-				frame, _, _, _, _ = infer_image(net, layer_names, height, width, frame, colors, labels, FLAGS)
+				frame, _, _, _, _ = infer_image(net, layer_names, height, width, frame, colors, labels, FLAGS, timer=timer)
 
 				if writer is None:
 					# Initialize the video writer
@@ -146,6 +214,9 @@ if __name__ == '__main__':
 			writer.release()
 			vid.release()
 
+			if timer is not None:
+				timer.report(FLAGS.profile_path)
+
 
 	else:
 		# Infer real-time on webcam
@@ -158,11 +229,11 @@ if __name__ == '__main__':
 
 			if count == 0:
 				frame, boxes, confidences, classids, idxs = infer_image(net, layer_names, \
-		    						height, width, frame, colors, labels, FLAGS)
+		    						height, width, frame, colors, labels, FLAGS, timer=timer)
 				count += 1
 			else:
 				frame, boxes, confidences, classids, idxs = infer_image(net, layer_names, \
-		    						height, width, frame, colors, labels, FLAGS, boxes, confidences, classids, idxs, infer=False)
+		    						height, width, frame, colors, labels, FLAGS, boxes, confidences, classids, idxs, infer=False, timer=timer)
 				count = (count + 1) % 6
 
 			cv.imshow('webcam', frame)
@@ -171,3 +242,6 @@ if __name__ == '__main__':
 				break
 		vid.release()
 		cv.destroyAllWindows()
+
+		if timer is not None:
+			timer.report(FLAGS.profile_path)
@@ -4,6 +4,8 @@ import cv2 as cv
 import subprocess
 import time
 import os
+import json
+from contextlib import contextmanager, nullcontext
 
 def show_image(img):
     cv.imshow("Image", img)
@@ -28,6 +30,158 @@ def draw_labels_and_boxes(img, boxes, confidences, classids, idxs, colors, label
     return img
 
 
+def load_net(config, weights):
+    # Load the weights and configutation to form the pretrained YOLOv3 model
+    net = cv.dnn.readNetFromDarknet(config, weights)
+
+    # Get the output layer names of the model
+    layer_names = net.getLayerNames()
+    layer_names = [layer_names[i - 1] for i in np.array(net.getUnconnectedOutLayers()).flatten()]
+
+    return net, layer_names
+
+
+def detection_records(boxes, confidences, classids, idxs, labels):
+    # One plain dict per box kept by Non-Maxima Suppression
+    if len(idxs) == 0:
+        return
+
+    for i in np.array(idxs).flatten():
+        x, y, w, h = boxes[i]
+        yield {'class_id': int(classids[i]), 'label': labels[classids[i]],
+               'confidence': float(confidences[i]),
+               'x': int(x), 'y': int(y), 'w': int(w), 'h': int(h)}
+
+
+class DetectionWriter:
+    """Streams detections to a .jsonl or .parquet file, one row per kept box."""
+
+    COLUMNS = [('frame', 'int64'), ('class_id', 'int64'), ('label', 'string'), ('confidence', 'float64'),
+               ('x', 'int64'), ('y', 'int64'), ('w', 'int64'), ('h', 'int64')]
+
+    def __init__(self, path, batch_size=4096):
+        self.path = path
+        self.format = os.path.splitext(path)[1].lower()
+        if self.format not in ('.jsonl', '.parquet'):
+            raise ValueError('Export path must end with .jsonl or .parquet, got {}'.format(path))
+
+        self.batch_size = batch_size
+        self.count = 0
+        self._rows = []
+        self._writer = None
+        if self.format == '.jsonl':
+            self._file = open(path, 'w')
+        else:
+            # Imported here so a missing pyarrow fails before inference starts, not at the first flush
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            self._pa, self._pq = pa, pq
+
+    def write(self, frame_idx, boxes, confidences, classids, idxs, labels):
+        for row in detection_records(boxes, confidences, classids, idxs, labels):
+            row = dict(frame=int(frame_idx), **row)
+
+            if self.format == '.jsonl':
+                self._file.write(json.dumps(row) + '\n')
+            else:
+                self._rows.append(row)
+            self.count += 1
+
+        # Parquet rows are flushed as row groups so memory stays bounded on long videos
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def _parquet_writer(self):
+        # A fixed schema, so every row group matches and an empty run still has typed columns
+        if self._writer is None:
+            schema = self._pa.schema([(name, self._pa.type_for_alias(dtype)) for name, dtype in self.COLUMNS])
+            self._writer = self._pq.ParquetWriter(self.path, schema)
+        return self._writer
+
+    def _flush(self):
+        if not self._rows:
+            return
+
+        writer = self._parquet_writer()
+        writer.write_table(self._pa.Table.from_pylist(self._rows, schema=writer.schema))
+        self._rows = []
+
+    def close(self):
+        if self.format == '.jsonl':
+            self._file.close()
+        else:
+            self._flush()
+            # With zero detections this writes an empty table, readers get a file either way
+            self._parquet_writer().close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StageTimer:
+    """Per-stage latencies of infer_image, summarised as mean/p95 at the end of a run."""
+
+    STAGES = ['blob', 'forward', 'decode', 'nms', 'draw', 'frame']
+
+    def __init__(self, input_size=416):
+        self.input_size = input_size
+        self.times = {name: [] for name in self.STAGES}
+        self.frames = 0
+        self.start = None
+        self.end = None
+
+    @contextmanager
+    def stage(self, name):
+        if self.start is None:
+            self.start = time.perf_counter()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name].append(time.perf_counter() - start)
+
+    def add_frame(self, seconds, inferred=True):
+        # Every frame counts for the FPS, only frames that ran inference for the 'frame' latency
+        if self.start is None:
+            self.start = time.perf_counter() - seconds
+        self.frames += 1
+        if inferred:
+            self.times['frame'].append(seconds)
+        self.end = time.perf_counter()
+
+    def summary(self):
+        frames = self.frames
+        wall = (self.end - self.start) if frames else 0.0
+        stages = {}
+        for name, values in self.times.items():
+            if values:
+                values = np.array(values) * 1000
+                stages[name] = {'count': len(values),
+                                'mean_ms': float(values.mean()),
+                                'p95_ms': float(np.percentile(values, 95))}
+
+        # End-to-end FPS includes reading, writing and showing frames between inferences
+        return {'input_size': self.input_size, 'frames': frames, 'inferred_frames': len(self.times['frame']),
+                'seconds': wall, 'fps': frames / wall if wall > 0 else 0.0, 'stages': stages}
+
+    def report(self, path=None):
+        summary = self.summary()
+        print ('[INFO] Profile at {0}x{0}: {1} frames ({2} inferred), {3:.2f} FPS end-to-end'.format(
+            summary['input_size'], summary['frames'], summary['inferred_frames'], summary['fps']))
+        for name, stats in summary['stages'].items():
+            print ('[INFO]   {:<8} mean {:9.3f} ms   p95 {:9.3f} ms   ({} calls)'.format(
+                name, stats['mean_ms'], stats['p95_ms'], stats['count']))
+
+        if path:
+            with open(path, 'w') as f:
+                json.dump(summary, f, indent=2)
+
+        return summary
+
+
 def generate_boxes_confidences_classids(outs, height, width, tconf):
     boxes = []
     confidences = []
@@ -62,19 +216,30 @@ def generate_boxes_confidences_classids(outs, height, width, tconf):
     return boxes, confidences, classids
 
 def infer_image(net, layer_names, height, width, img, colors, labels, FLAGS, 
-            boxes=None, confidences=None, classids=None, idxs=None, infer=True):
-    
+            boxes=None, confidences=None, classids=None, idxs=None, infer=True, draw=True,
+            timer=None):
+
+    # Frames that reuse earlier detections (infer=False, e.g. the webcam loop) count for the
+    # FPS, but their stages are not timed, their near-zero timings would skew the means
+    def stage(name):
+        return timer.stage(name) if timer is not None and infer else nullcontext()
+
+    frame_start = time.perf_counter()
+
     if infer:
-        # Contructing a blob from the input image
-        blob = cv.dnn.blobFromImage(img, 1 / 255.0, (416, 416), 
-                        swapRB=True, crop=False)
+        # Contructing a blob from the input image at the selected network resolution
+        input_size = getattr(FLAGS, 'input_size', 416)
+        with stage('blob'):
+            blob = cv.dnn.blobFromImage(img, 1 / 255.0, (input_size, input_size), 
+                            swapRB=True, crop=False)
 
         # Perform a forward pass of the YOLO object detector
         net.setInput(blob)
 
         # Getting the outputs from the output layers
         start = time.time()
-        outs = net.forward(layer_names)
+        with stage('forward'):
+            outs = net.forward(layer_names)
         end = time.time()
 
         if FLAGS.show_time:
@@ -82,15 +247,22 @@ def infer_image(net, layer_names, height, width, img, colors, labels, FLAGS,
 
         
         # Generate the boxes, confidences, and classIDs
-        boxes, confidences, classids = generate_boxes_confidences_classids(outs, height, width, FLAGS.confidence)
+        with stage('decode'):
+            boxes, confidences, classids = generate_boxes_confidences_classids(outs, height, width, FLAGS.confidence)
         
         # Apply Non-Maxima Suppression to suppress overlapping bounding boxes
-        idxs = cv.dnn.NMSBoxes(boxes, confidences, FLAGS.confidence, FLAGS.threshold)
+        with stage('nms'):
+            idxs = cv.dnn.NMSBoxes(boxes, confidences, FLAGS.confidence, FLAGS.threshold)
 
     if boxes is None or confidences is None or idxs is None or classids is None:
         raise '[ERROR] Required variables are set to None before drawing boxes on images.'
         
-    # Draw labels and boxes on the image
-    img = draw_labels_and_boxes(img, boxes, confidences, classids, idxs, colors, labels)
+    # Draw labels and boxes on the image (skipped in headless export mode)
+    if draw:
+        with stage('draw'):
+            img = draw_labels_and_boxes(img, boxes, confidences, classids, idxs, colors, labels)
+
+    if timer is not None:
+        timer.add_frame(time.perf_counter() - frame_start, inferred=infer)
 
     return img, boxes, confidences, classids, idxs
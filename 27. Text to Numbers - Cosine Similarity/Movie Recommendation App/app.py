@@ -1,9 +1,9 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import utility  # Ensure utility contains the preprocessing function
+import artifacts
+from neighbours import build_neighbour_index
+from title_index import TitleIndex
+from poster_cache import PosterCache
 
 
 # Page configuration
@@ -123,39 +123,59 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Load and preprocess data
-@st.cache_data
+@st.cache_resource
+def load_bundle():
+    """The prebuilt artifact bundle, None if build_index.py has not been run"""
+    try:
+        return artifacts.load_bundle('artifacts')
+    except FileNotFoundError:
+        return None
+
+# Load the prebuilt artifact bundle, falling back to building everything in-process
+@st.cache_resource
 def load_data():
-    """Load and preprocess movie data for recommendations"""
+    """Load movie data and the neighbour index for recommendations"""
+    bundle = load_bundle()
+    if bundle is not None:
+        return bundle.movie_data, bundle.neighbour_index
+
     try:
         movie_data = pd.read_csv('imdb_top_1000.csv')
-        data = movie_data[['Overview', 'Director', 'Genre', 'Star1', 'Poster_Link']]
-        data['combined_info'] = data.apply(lambda x: ' '.join(x.astype(str)), axis=1)
-        data['combined_info'] = data['combined_info'].apply(utility.preprocess_text)
-        
-        tf = TfidfVectorizer(ngram_range=(1,2), max_features=10000, stop_words='english')
-        tf_idf_matrix = tf.fit_transform(data['combined_info'])
-        doc_sim_df = pd.DataFrame(cosine_similarity(tf_idf_matrix))
+        _, tf_idf_matrix = artifacts.build_features(movie_data)
+
+        # Keep only the top-k neighbours per movie instead of a dense N x N matrix
+        neighbour_index = build_neighbour_index(tf_idf_matrix, k=20)
         
-        return movie_data, doc_sim_df
+        return movie_data, neighbour_index
     except Exception as e:
         st.error(f"Error loading data: {str(e)}")
         return None, None
 
-def movie_recommender(movie_title, movie_data, doc_sims, num_movies=10):
+@st.cache_resource
+def load_title_index(_movie_data):
+    """Hash and trigram index over the titles, memory-mapped from the bundle or built once per process"""
+    bundle = load_bundle()
+    if bundle is not None:
+        return bundle.title_index
+    return TitleIndex(_movie_data['Series_Title'].tolist())
+
+@st.cache_resource
+def load_poster_cache():
+    """Local thumbnail cache shared by all sessions of this process"""
+    return PosterCache('poster_cache')
+
+def movie_recommender(movie_title, movie_data, neighbour_index, title_index, num_movies=10):
     """Generate movie recommendations based on content similarity"""
     try:
-        movies = movie_data['Series_Title'].values
-        movie_idx = np.where(movies == movie_title)[0][0]
-        movie_similarities = doc_sims.iloc[movie_idx].values
-        similar_movie_idxs = np.argsort(-movie_similarities)[1:num_movies+1]
+        movie_idx = title_index.lookup(movie_title)
+        similar_movie_idxs, _ = neighbour_index.neighbours(movie_idx, num_movies)
         similar_movies = movie_data.iloc[similar_movie_idxs]
         return similar_movies
     except Exception as e:
         st.error(f"Error generating recommendations: {str(e)}")
         return pd.DataFrame()
 
-def display_movie_card(movie, key_suffix=""):
+def display_movie_card(movie, key_suffix="", poster_path=None):
     """Display a movie card using Streamlit components"""
     # Handle missing values
     title = str(movie.get('Series_Title', 'Unknown Title'))
@@ -182,7 +202,10 @@ def display_movie_card(movie, key_suffix=""):
     with st.container():
         # Display poster image with error handling
         try:
-            if poster_url and poster_url != 'nan':
+            if poster_path:
+                # Thumbnail prefetched into the local poster cache
+                st.image(poster_path, width=200, use_container_width=True)
+            elif poster_url and poster_url != 'nan':
                 st.image(poster_url, width=200, use_container_width=True)
             else:
                 st.image("https://via.placeholder.com/300x450/cccccc/666666?text=No+Image", 
@@ -220,12 +243,14 @@ def main():
     
     # Load data
     with st.spinner("Loading movie database..."):
-        movie_data, doc_sim_df = load_data()
+        movie_data, neighbour_index = load_data()
     
     if movie_data is None:
         st.error("Failed to load movie data. Please check your data file.")
         return
     
+    title_index = load_title_index(movie_data)
+    
     # Movie selection section
     st.markdown('<div class="selection-container">', unsafe_allow_html=True)
     
@@ -233,9 +258,18 @@ def main():
     
     with col2:
         st.markdown("### 🔍 Select a Movie")
+        query = st.text_input('Search titles:', placeholder='Type part of a title, typos are fine')
+        options = movie_data['Series_Title'].values
+        if query:
+            matches = title_index.search(query, limit=50)
+            if matches:
+                options = [title_index.titles[row] for row in matches]
+            else:
+                st.info(f'No titles match "{query}", showing all movies.')
+        
         selected_movie = st.selectbox(
             'Choose a movie you enjoyed:',
-            movie_data['Series_Title'].values,
+            options,
             help="Select a movie to get personalized recommendations based on similar content"
         )
         
@@ -249,9 +283,15 @@ def main():
             recommended_movies = movie_recommender(
                 selected_movie, 
                 movie_data, 
-                doc_sims=doc_sim_df, 
+                neighbour_index=neighbour_index, 
+                title_index=title_index, 
                 num_movies=10
             )
+            
+            # Fetch all posters concurrently into the local cache before rendering the cards
+            poster_cache = load_poster_cache()
+            poster_paths = poster_cache.prefetch(recommended_movies['Poster_Link'].astype(str).tolist()) \
+                if not recommended_movies.empty else {}
         
         if not recommended_movies.empty:
             st.markdown(f"""
@@ -269,7 +309,8 @@ def main():
                     if movie_idx < len(recommended_movies):
                         with col:
                             movie = recommended_movies.iloc[movie_idx]
-                            display_movie_card(movie, key_suffix=f"_{movie_idx}")
+                            display_movie_card(movie, key_suffix=f"_{movie_idx}",
+                                               poster_path=poster_paths.get(str(movie.get('Poster_Link', ''))))
             
             # Additional information
             st.markdown("---")
@@ -282,14 +323,10 @@ def main():
             # Show similarity scores
             st.markdown("### 📊 Recommendation Scores")
             similarity_data = []
-            movies = movie_data['Series_Title'].values
-            selected_idx = np.where(movies == selected_movie)[0][0]
-            similarities = doc_sim_df.iloc[selected_idx].values
+            selected_idx = title_index.lookup(selected_movie)
+            _, similarities = neighbour_index.neighbours(selected_idx, len(recommended_movies))
             
-            for idx in range(len(recommended_movies)):
-                movie_title = recommended_movies.iloc[idx]['Series_Title']
-                movie_idx = np.where(movies == movie_title)[0][0]
-                similarity_score = similarities[movie_idx]
+            for movie_title, similarity_score in zip(recommended_movies['Series_Title'], similarities):
                 similarity_data.append({
                     'Movie': movie_title,
                     'Similarity Score': f"{similarity_score:.3f}",
@@ -299,6 +336,12 @@ def main():
             similarity_df = pd.DataFrame(similarity_data)
             st.dataframe(similarity_df, use_container_width=True)
             
+            # Poster cache effectiveness
+            stats = poster_cache.stats()
+            st.caption(f"🖼️ Poster cache: {stats['hit_rate'] * 100:.0f}% hit rate "
+                       f"({stats['hits']} hits, {stats['misses']} misses, {stats['failures']} failed), "
+                       f"fetch latency mean {stats['fetch_ms_mean']:.0f} ms, p95 {stats['fetch_ms_p95']:.0f} ms")
+            
         else:
             st.error("No recommendations could be generated. Please try selecting a different movie.")
 
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+
+import joblib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import utility
+from neighbours import NeighbourIndex, build_neighbour_index
+from title_index import TitleIndex
+
+# Bump when the layout of the bundle changes so old bundles are never misread
+ARTIFACT_VERSION = 1
+
+TFIDF_PARAMS = {'ngram_range': (1, 2), 'max_features': 10000, 'stop_words': 'english'}
+TEXT_COLUMNS = ['Overview', 'Director', 'Genre', 'Star1', 'Poster_Link']
+
+
+class Bundle:
+    """A loaded artifact bundle, with the large arrays memory-mapped from disk"""
+
+    def __init__(self, path, manifest, movie_data, tf_idf_matrix, neighbour_index):
+        self.path = path
+        self.manifest = manifest
+        self.movie_data = movie_data
+        self.tf_idf_matrix = tf_idf_matrix
+        self.neighbour_index = neighbour_index
+        # TF-IDF rows of movies added after the build, see incremental.py
+        self.extra_matrix = None
+        self.vocabulary_norms = None
+        self._vectorizer = None
+        self._title_index = None
+
+    @property
+    def vectorizer(self):
+        # Only needed to vectorize new movies, so it is not loaded at startup
+        if self._vectorizer is None:
+            self._vectorizer = joblib.load(os.path.join(self.path, 'tfidf_vectorizer.pkl'))
+        return self._vectorizer
+
+    @property
+    def title_index(self):
+        # The posting lists are memory-mapped from the bundle, bundles written before the
+        # title index was persisted get it built from the titles instead
+        if self._title_index is None:
+            titles = self.movie_data['Series_Title'].iloc[:self.manifest['movies']].tolist()
+            if all(os.path.exists(os.path.join(self.path, name)) for name in TitleIndex.FILES):
+                self._title_index = TitleIndex.load(self.path, titles)
+            else:
+                self._title_index = TitleIndex(titles)
+        # Movies added since the build are indexed on top
+        titles = self.movie_data['Series_Title']
+        if len(self._title_index) < len(titles):
+            self._title_index.add(titles.iloc[len(self._title_index):].tolist())
+        return self._title_index
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def combined_info(movie_data):
+    """Join the descriptive columns of every movie into one preprocessed document"""
+    data = movie_data[TEXT_COLUMNS].astype(str)
+    texts = data.apply(lambda x: ' '.join(x), axis=1)
+    return utility.preprocess_batch(texts)
+
+
+def build_features(movie_data):
+    # float32 from the start, the neighbour search never densifies float64 blocks
+    tf = TfidfVectorizer(dtype=np.float32, **TFIDF_PARAMS)
+    tf_idf_matrix = tf.fit_transform(combined_info(movie_data))
+    return tf, tf_idf_matrix
+
+
+def build_bundle(data_path, out_dir='artifacts', k=20, chunk_size=None, approximate=False):
+    """Build the vectorizer, TF-IDF matrix and neighbour index and write them as a new bundle"""
+    params = {'version': ARTIFACT_VERSION, 'k': k, 'tfidf': TFIDF_PARAMS, 'approximate': approximate}
+    source_hash = file_hash(data_path)
+    bundle_id = 'v{}-{}'.format(ARTIFACT_VERSION, hashlib.sha256(
+        (source_hash + json.dumps(params, sort_keys=True)).encode()).hexdigest()[:12])
+
+    start = time.time()
+    movie_data = pd.read_csv(data_path)
+    tf, tf_idf_matrix = build_features(movie_data)
+    tf_idf_matrix = tf_idf_matrix.tocsr()
+    neighbour_index = build_neighbour_index(tf_idf_matrix, k=k, chunk_size=chunk_size, approximate=approximate)
+
+    manifest = dict(params, bundle_id=bundle_id, source=os.path.basename(data_path),
+                    source_sha256=source_hash, movies=len(movie_data),
+                    vocabulary=len(tf.vocabulary_), shape=list(tf_idf_matrix.shape),
+                    build_seconds=round(time.time() - start, 3))
+    final_dir = write_bundle(out_dir, manifest, movie_data, tf, tf_idf_matrix,
+                             neighbour_index.indices, neighbour_index.scores)
+
+    return final_dir, manifest
+
+
+def write_bundle(out_dir, manifest, movie_data, vectorizer, tf_idf_matrix,
+                 neighbour_indices, neighbour_scores):
+    """Write a bundle directory and point LATEST at it"""
+    bundle_id = manifest['bundle_id']
+
+    # Write into a temporary directory first so readers never see a half written bundle
+    os.makedirs(out_dir, exist_ok=True)
+    final_dir = os.path.join(out_dir, bundle_id)
+    tmp_dir = final_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    movie_data.to_pickle(os.path.join(tmp_dir, 'movies.pkl'))
+    joblib.dump(vectorizer, os.path.join(tmp_dir, 'tfidf_vectorizer.pkl'))
+    np.save(os.path.join(tmp_dir, 'tfidf_data.npy'), tf_idf_matrix.data)
+    np.save(os.path.join(tmp_dir, 'tfidf_indices.npy'), tf_idf_matrix.indices)
+    np.save(os.path.join(tmp_dir, 'tfidf_indptr.npy'), tf_idf_matrix.indptr)
+    np.save(os.path.join(tmp_dir, 'neighbour_indices.npy'), neighbour_indices)
+    np.save(os.path.join(tmp_dir, 'neighbour_scores.npy'), neighbour_scores)
+    TitleIndex(movie_data['Series_Title'].tolist()).save(tmp_dir)
+
+    with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.replace(tmp_dir, final_dir)
+
+    # LATEST is swapped atomically so running apps pick up the new bundle on their next start
+    with open(os.path.join(out_dir, 'LATEST.tmp'), 'w') as f:
+        f.write(bundle_id)
+    os.replace(os.path.join(out_dir, 'LATEST.tmp'), os.path.join(out_dir, 'LATEST'))
+
+    return final_dir
+
+
+def resolve_bundle(path='artifacts'):
+    """Accept either a bundle directory or an artifacts directory with a LATEST pointer"""
+    latest = os.path.join(path, 'LATEST')
+    if os.path.exists(latest):
+        with open(latest) as f:
+            path = os.path.join(path, f.read().strip())
+
+    if not os.path.exists(os.path.join(path, 'manifest.json')):
+        raise FileNotFoundError('No artifact bundle found at {}, run build_index.py first'.format(path))
+    return path
+
+
+def load_bundle(path='artifacts', mmap_mode='r'):
+    path = resolve_bundle(path)
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest['version'] != ARTIFACT_VERSION:
+        raise ValueError('Bundle {} has version {}, expected {}'.format(
+            path, manifest['version'], ARTIFACT_VERSION))
+
+    def load(name):
+        return np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+
+    tf_idf_matrix = sparse.csr_matrix(
+        (load('tfidf_data.npy'), load('tfidf_indices.npy'), load('tfidf_indptr.npy')),
+        shape=tuple(manifest['shape']), copy=False)
+    neighbour_index = NeighbourIndex(load('neighbour_indices.npy'), load('neighbour_scores.npy'))
+    movie_data = pd.read_pickle(os.path.join(path, 'movies.pkl'))
+    bundle = Bundle(path, manifest, movie_data, tf_idf_matrix, neighbour_index)
+
+    # Movies inserted since the last build or compaction
+    if os.path.isdir(os.path.join(path, 'updates')):
+        from incremental import apply_updates
+        apply_updates(bundle)
+
+    return bundle
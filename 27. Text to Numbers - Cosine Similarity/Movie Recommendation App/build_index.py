@@ -0,0 +1,25 @@
+import argparse
+import time
+
+from artifacts import build_bundle
+
+# Builds the artifact bundle the app memory-maps at startup
+# python build_index.py --data imdb_top_1000.csv --out artifacts
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the movie recommender artifact bundle')
+    parser.add_argument('--data', default='imdb_top_1000.csv', help='Movie catalogue CSV')
+    parser.add_argument('--out', default='artifacts', help='Directory the versioned bundles are written to')
+    parser.add_argument('-k', type=int, default=20, help='Neighbours kept per movie')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Movies compared per sparse product, bounds the build memory '
+                             '(default: as many as fit in 256 MB)')
+    parser.add_argument('--approximate', action='store_true',
+                        help='Find neighbours through an LSH index instead of comparing every pair')
+    args = parser.parse_args()
+
+    start = time.time()
+    path, manifest = build_bundle(args.data, args.out, k=args.k, chunk_size=args.chunk_size,
+                                  approximate=args.approximate)
+    print(f"Built {manifest['bundle_id']} with {manifest['movies']} movies and "
+          f"{manifest['vocabulary']} terms in {time.time() - start:.1f}s -> {path}")
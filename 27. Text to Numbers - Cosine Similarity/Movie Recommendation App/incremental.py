@@ -0,0 +1,216 @@
+import os
+import glob
+import time
+import shutil
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.preprocessing import normalize
+from sklearn.utils import murmurhash3_32
+
+import artifacts
+from neighbours import top_k_rows, default_chunk_size
+
+# Out-of-vocabulary terms of added movies are hashed into this many extra columns,
+# so e.g. two new movies by a director the vectorizer never saw still match each other
+HASH_FEATURES = 2 ** 18
+
+
+def vectorize(vectorizer, docs):
+    """TF-IDF rows against the persisted vocabulary, with hashed columns for unseen terms"""
+    analyzer = vectorizer.build_analyzer()
+    vocabulary = vectorizer.vocabulary_
+    idf = vectorizer.idf_
+    # An unseen term is treated as at least as rare as the rarest term seen at fit time
+    oov_idf = idf.max()
+
+    rows, cols, values = [], [], []
+    for row, doc in enumerate(docs):
+        for term, count in Counter(analyzer(doc)).items():
+            col = vocabulary.get(term)
+            if col is None:
+                col = len(idf) + murmurhash3_32(term, positive=True) % HASH_FEATURES
+                weight = oov_idf
+            else:
+                weight = idf[col]
+            rows.append(row)
+            cols.append(col)
+            values.append(count * weight)
+
+    matrix = sparse.csr_matrix((values, (rows, cols)), dtype=np.float32,
+                               shape=(len(docs), len(idf) + HASH_FEATURES))
+    return normalize(matrix)
+
+
+def similarities(bundle, queries):
+    """Sparse cosine similarities of query rows against every movie in the bundle
+
+    Against the base rows only the vocabulary columns count, renormalised. A term that
+    max_features pruned at fit time is hashed for a new movie but is absent from every
+    base row, so leaving it in the norm would deflate all scores against the catalogue
+    (an exact copy of a movie would not score 1.0 against it). The hashed columns are
+    only compared between added movies.
+    """
+    base = bundle.tf_idf_matrix
+    n_terms = len(bundle.vectorizer.idf_)
+    vocabulary_queries = normalize(queries[:, :n_terms])
+    vocabulary_queries.resize(queries.shape[0], base.shape[1])
+    base_sims = vocabulary_queries @ base.T
+    if base.shape[1] > n_terms:
+        # A compacted bundle keeps earlier added movies, hashed columns included, among its base rows
+        base_sims = base_sims @ sparse.diags(1 / vocabulary_norms(bundle))
+    parts = [base_sims]
+    if bundle.extra_matrix is not None:
+        parts.append(queries @ bundle.extra_matrix.T)
+    return sparse.hstack(parts).tocsr()
+
+
+def vocabulary_norms(bundle):
+    """L2 norm of the vocabulary columns of every base row, computed once per loaded bundle"""
+    if bundle.vocabulary_norms is None:
+        base = bundle.tf_idf_matrix
+        in_vocabulary = (np.arange(base.shape[1]) < len(bundle.vectorizer.idf_)).astype(np.float32)
+        norms = np.sqrt(base.multiply(base) @ in_vocabulary)
+        # Rows without any vocabulary term score 0 against every new movie
+        norms[norms == 0] = np.inf
+        bundle.vocabulary_norms = norms
+    return bundle.vocabulary_norms
+
+
+def add_movies(bundle, new_movies, chunk_size=None):
+    """Insert movies into a loaded bundle without refitting anything.
+
+    Only the new rows get their neighbours computed, and existing movies are
+    re-ranked only where a new movie beats their current k-th neighbour.
+    Returns the update that save_update() persists.
+    """
+    index = bundle.neighbour_index
+    n_old = len(index)
+    n_new = len(new_movies)
+
+    queries = vectorize(bundle.vectorizer, artifacts.combined_info(new_movies))
+    bundle.extra_matrix = queries if bundle.extra_matrix is None else \
+        sparse.vstack([bundle.extra_matrix, queries]).tocsr()
+    bundle.movie_data = pd.concat([bundle.movie_data, new_movies], ignore_index=True)
+
+    # Neighbours of the new rows, against old and new movies alike
+    chunk_size = chunk_size or default_chunk_size(n_old + n_new)
+    new_indices = np.empty((n_new, index.k), dtype=np.int32)
+    new_scores = np.empty((n_new, index.k), dtype=np.float32)
+    reverse = {}
+    for start in range(0, n_new, chunk_size):
+        end = min(start + chunk_size, n_new)
+        sims = similarities(bundle, queries[start:end])
+
+        dense = sims.toarray().astype(np.float32)
+        rows = np.arange(end - start)
+        dense[rows, n_old + start + rows] = -np.inf
+        new_indices[start:end], new_scores[start:end] = top_k_rows(dense, index.k)
+
+        # Reverse neighbours: only existing movies sharing terms with a new one can change,
+        # and only those whose k-th neighbour scores lower than the new movie
+        old = sims[:, :n_old].tocoo()
+        beaten = old.data > index.lowest_scores(old.col)
+        for query, movie, score in zip(old.row[beaten], old.col[beaten], old.data[beaten]):
+            reverse.setdefault(int(movie), []).append((n_old + start + int(query), float(score)))
+
+    index.append(new_indices, new_scores)
+
+    patched_rows = sorted(reverse)
+    patched_indices = np.empty((len(patched_rows), index.k), dtype=np.int32)
+    patched_scores = np.empty((len(patched_rows), index.k), dtype=np.float32)
+    for i, movie in enumerate(patched_rows):
+        indices, scores = index.row(movie)
+        added = reverse[movie]
+        indices = np.concatenate([indices, [row for row, _ in added]])
+        scores = np.concatenate([scores, [score for _, score in added]])
+        order = np.argsort(-scores, kind='stable')[:index.k]
+        patched_indices[i], patched_scores[i] = indices[order], scores[order]
+        index.patch(movie, patched_indices[i], patched_scores[i])
+
+    return {'movies': new_movies, 'tf_idf': queries,
+            'neighbour_indices': new_indices, 'neighbour_scores': new_scores,
+            'patched_rows': np.array(patched_rows, dtype=np.int64),
+            'patched_indices': patched_indices, 'patched_scores': patched_scores}
+
+
+def save_update(bundle, update):
+    """Append an update segment to the bundle directory, the base arrays are left untouched"""
+    updates_dir = os.path.join(bundle.path, 'updates')
+    os.makedirs(updates_dir, exist_ok=True)
+    segment = os.path.join(updates_dir, '{:06d}'.format(len(list_segments(bundle.path)) + 1))
+    tmp_dir = segment + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    update['movies'].to_pickle(os.path.join(tmp_dir, 'movies.pkl'))
+    sparse.save_npz(os.path.join(tmp_dir, 'tfidf.npz'), update['tf_idf'])
+    np.savez(os.path.join(tmp_dir, 'neighbours.npz'),
+             **{name: update[name] for name in ('neighbour_indices', 'neighbour_scores', 'patched_rows',
+                                               'patched_indices', 'patched_scores')})
+
+    os.replace(tmp_dir, segment)
+    return segment
+
+
+def list_segments(path):
+    return sorted(p for p in glob.glob(os.path.join(path, 'updates', '*')) if not p.endswith('.tmp'))
+
+
+def apply_updates(bundle):
+    """Replay the saved update segments on top of a freshly loaded bundle"""
+    segments = list_segments(bundle.path)
+    if not segments:
+        return bundle
+
+    movies, matrices = [bundle.movie_data], []
+    for segment in segments:
+        movies.append(pd.read_pickle(os.path.join(segment, 'movies.pkl')))
+        matrices.append(sparse.load_npz(os.path.join(segment, 'tfidf.npz')))
+
+        arrays = np.load(os.path.join(segment, 'neighbours.npz'))
+        bundle.neighbour_index.append(arrays['neighbour_indices'], arrays['neighbour_scores'])
+        for row, indices, scores in zip(arrays['patched_rows'], arrays['patched_indices'],
+                                        arrays['patched_scores']):
+            bundle.neighbour_index.patch(row, indices, scores)
+
+    bundle.movie_data = pd.concat(movies, ignore_index=True)
+    bundle.extra_matrix = sparse.vstack(matrices).tocsr()
+    return bundle
+
+
+def insert_movies(path, new_movies):
+    """Load the latest bundle, add the movies and persist them as one update segment"""
+    bundle = artifacts.load_bundle(path)
+    start = time.time()
+    update = add_movies(bundle, new_movies)
+    save_update(bundle, update)
+    return bundle, update, time.time() - start
+
+
+def compact(path='artifacts'):
+    """Fold all update segments into a new bundle revision with plain memory-mappable arrays"""
+    bundle = artifacts.load_bundle(path)
+    manifest = dict(bundle.manifest)
+
+    tf_idf_matrix = bundle.tf_idf_matrix
+    if bundle.extra_matrix is not None:
+        width = bundle.extra_matrix.shape[1]
+        tf_idf_matrix = sparse.vstack([
+            sparse.csr_matrix((tf_idf_matrix.data, tf_idf_matrix.indices, tf_idf_matrix.indptr),
+                              shape=(tf_idf_matrix.shape[0], width)),
+            bundle.extra_matrix]).tocsr()
+    indices, scores = bundle.neighbour_index.to_arrays()
+
+    manifest['revision'] = manifest.get('revision', 0) + 1
+    manifest['bundle_id'] = '{}-r{}'.format(manifest['bundle_id'].split('-r')[0], manifest['revision'])
+    manifest['compacted_from'] = bundle.manifest['bundle_id']
+    manifest['movies'] = len(bundle.movie_data)
+    manifest['shape'] = list(tf_idf_matrix.shape)
+
+    out_dir = os.path.dirname(bundle.path)
+    final_dir = artifacts.write_bundle(out_dir, manifest, bundle.movie_data, bundle.vectorizer,
+                                       tf_idf_matrix.astype(np.float32), indices, scores)
+    return final_dir, manifest
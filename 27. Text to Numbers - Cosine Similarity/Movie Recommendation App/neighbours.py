@@ -0,0 +1,148 @@
+import numpy as np
+
+from ann_index import LSHIndex
+
+# Working memory of one chunk of the exact search: the dense float32 similarities, their
+# negation in top_k_rows and the int64 argpartition result, 16 bytes per (query, movie) pair
+CHUNK_MEMORY_BYTES = 256 * 2 ** 20
+
+
+class NeighbourIndex:
+    """Top-k most similar movies per movie, kept as compact int32/float32 arrays
+
+    `indices` and `scores` are usually memory-mapped from an artifact bundle and never
+    written to. Movies added later live in the `extra_*` arrays, and rows whose
+    neighbours changed because of them are overridden through `patches`.
+    """
+
+    def __init__(self, indices, scores):
+        self.indices = indices
+        self.scores = scores
+        self.extra_indices = np.empty((0, indices.shape[1]), dtype=np.int32)
+        self.extra_scores = np.empty((0, indices.shape[1]), dtype=np.float32)
+        self.patches = {}
+
+    @property
+    def k(self):
+        return self.indices.shape[1]
+
+    def __len__(self):
+        return self.indices.shape[0] + self.extra_indices.shape[0]
+
+    def row(self, row):
+        if row in self.patches:
+            return self.patches[row]
+        if row < self.indices.shape[0]:
+            return self.indices[row], self.scores[row]
+        row -= self.indices.shape[0]
+        return self.extra_indices[row], self.extra_scores[row]
+
+    def neighbours(self, row, num=None):
+        """Return (movie indices, similarity scores) of the `num` closest movies, best first"""
+        num = self.k if num is None else min(num, self.k)
+        indices, scores = self.row(row)
+        return indices[:num], scores[:num]
+
+    def lowest_scores(self, rows):
+        """Score of the k-th neighbour of each row, the bar a new movie has to clear"""
+        rows = np.asarray(rows)
+        lowest = np.empty(len(rows), dtype=np.float32)
+        base = rows < self.indices.shape[0]
+        lowest[base] = self.scores[rows[base], -1]
+        lowest[~base] = self.extra_scores[rows[~base] - self.indices.shape[0], -1]
+
+        if self.patches:
+            patched = np.array(sorted(self.patches))
+            pos = np.minimum(np.searchsorted(patched, rows), len(patched) - 1)
+            for i in np.flatnonzero(patched[pos] == rows):
+                lowest[i] = self.patches[int(rows[i])][1][-1]
+        return lowest
+
+    def append(self, indices, scores):
+        self.extra_indices = np.vstack([self.extra_indices, indices.astype(np.int32)])
+        self.extra_scores = np.vstack([self.extra_scores, scores.astype(np.float32)])
+
+    def patch(self, row, indices, scores):
+        self.patches[int(row)] = (indices.astype(np.int32), scores.astype(np.float32))
+
+    def to_arrays(self):
+        """Materialise base, added and patched rows into two plain arrays"""
+        indices = np.vstack([self.indices, self.extra_indices])
+        scores = np.vstack([self.scores, self.extra_scores])
+        for row, (row_indices, row_scores) in self.patches.items():
+            indices[row], scores[row] = row_indices, row_scores
+        return indices, scores
+
+
+def top_k_rows(sims, k):
+    """Column indices and values of the k largest entries of every row of a dense block"""
+    # argpartition finds the k best in linear time, only those k get sorted
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(sims, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def default_chunk_size(n_rows, memory_bytes=CHUNK_MEMORY_BYTES):
+    """Query rows compared at a time so that a chunk against n_rows movies fits in memory_bytes"""
+    return max(1, memory_bytes // (16 * max(n_rows, 1)))
+
+
+def top_k_similar(queries, matrix, k, offset=None, chunk_size=None):
+    """Find the k rows of `matrix` most similar to each row of `queries`.
+
+    Rows are expected to be L2 normalised (the TfidfVectorizer default), so cosine
+    similarity is a plain sparse dot product. Only `chunk_size` query rows are
+    compared at a time, which bounds the working memory to chunk_size x N floats;
+    by default as many as fit in CHUNK_MEMORY_BYTES. Both matrices should be float32,
+    a float64 product doubles the size of every chunk.
+    If `offset` is given, query row i is row offset + i of `matrix` and is never
+    returned as its own neighbour.
+    """
+    n_queries, n_rows = queries.shape[0], matrix.shape[0]
+    k = min(k, n_rows - 1 if offset is not None else n_rows)
+    chunk_size = chunk_size or default_chunk_size(n_rows)
+
+    indices = np.empty((n_queries, k), dtype=np.int32)
+    scores = np.empty((n_queries, k), dtype=np.float32)
+    matrix_t = matrix.T.tocsc()
+
+    for start in range(0, n_queries, chunk_size):
+        end = min(start + chunk_size, n_queries)
+        sims = (queries[start:end] @ matrix_t)
+        sims = sims.toarray() if hasattr(sims, 'toarray') else np.asarray(sims)
+        sims = sims.astype(np.float32, copy=False)
+
+        if offset is not None:
+            rows = np.arange(end - start)
+            sims[rows, offset + start + rows] = -np.inf
+
+        indices[start:end], scores[start:end] = top_k_rows(sims, k)
+
+    return indices, scores
+
+
+def build_neighbour_index(tf_idf_matrix, k=20, chunk_size=None, approximate=False):
+    """Build the top-k neighbour index of every movie against the whole catalogue
+
+    With `approximate` each movie is only compared with the candidates an LSH index
+    buckets it with, which keeps the build sub-quadratic on very large catalogues.
+    """
+    if approximate:
+        return approximate_neighbour_index(tf_idf_matrix, k=k)
+    indices, scores = top_k_similar(tf_idf_matrix, tf_idf_matrix, k, offset=0, chunk_size=chunk_size)
+    return NeighbourIndex(indices, scores)
+
+
+def approximate_neighbour_index(tf_idf_matrix, k=20, n_tables=16, n_bits=6):
+    # TF-IDF neighbours of a movie are only mildly similar (cosine ~0.1-0.2), so this
+    # needs more tables and shorter codes than dense embeddings to keep recall up
+    n_rows = tf_idf_matrix.shape[0]
+    k = min(k, n_rows - 1)
+    lsh = LSHIndex(n_tables, n_bits).build(tf_idf_matrix)
+
+    indices = np.empty((n_rows, k), dtype=np.int32)
+    scores = np.empty((n_rows, k), dtype=np.float32)
+    for row, (row_indices, row_scores) in enumerate(lsh.query(tf_idf_matrix, k, exclude=np.arange(n_rows))):
+        indices[row], scores[row] = row_indices, row_scores
+    return NeighbourIndex(indices, scores)
@@ -0,0 +1,139 @@
+import io
+import os
+import time
+import asyncio
+import hashlib
+import threading
+import urllib.request
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+
+class PosterCache:
+    """Resized poster thumbnails on local disk, fetched concurrently and evicted least recently used first"""
+
+    def __init__(self, cache_dir='poster_cache', max_bytes=200 * 1024 * 1024, size=(300, 450),
+                 concurrency=10, timeout=5):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.size = size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.fetch_seconds = deque(maxlen=1000)
+        self._lock = threading.Lock()
+
+    def path_for(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode()).hexdigest() + '.jpg')
+
+    def get(self, url):
+        """Local path of a cached poster, or None"""
+        path = self.path_for(url)
+        try:
+            # The modification time doubles as the last-used time for LRU eviction
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            return None
+
+    def _download(self, url):
+        request = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+    def _store(self, url, data):
+        image = Image.open(io.BytesIO(data)).convert('RGB')
+        image.thumbnail(self.size)
+
+        path = self.path_for(url)
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        image.save(tmp_path, 'JPEG', quality=85)
+        os.replace(tmp_path, path)
+        return path
+
+    async def _fetch(self, url, semaphore, executor):
+        loop = asyncio.get_running_loop()
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                data = await loop.run_in_executor(executor, self._download, url)
+                return await loop.run_in_executor(executor, self._store, url, data)
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                return None
+            finally:
+                with self._lock:
+                    self.fetch_seconds.append(time.perf_counter() - start)
+
+    async def prefetch_async(self, urls):
+        """Map every URL to a local thumbnail path (None if it could not be fetched)"""
+        paths = {}
+        missing = []
+        for url in dict.fromkeys(url for url in urls if url and url != 'nan'):
+            path = self.get(url)
+            with self._lock:
+                if path:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            if path:
+                paths[url] = path
+            else:
+                missing.append(url)
+
+        # a dedicated pool, so `concurrency` downloads really run in parallel whatever the size
+        # of the event loop's default executor; the semaphore keeps queued URLs out of fetch_ms
+        semaphore = asyncio.Semaphore(self.concurrency)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            fetched = await asyncio.gather(*[self._fetch(url, semaphore, executor) for url in missing])
+        paths.update(zip(missing, fetched))
+
+        if missing:
+            self.evict(keep=set(paths.values()))
+        return paths
+
+    def prefetch(self, urls):
+        """Blocking wrapper, Streamlit scripts do not run inside an event loop"""
+        return asyncio.run(self.prefetch_async(urls))
+
+    def evict(self, keep=()):
+        """Remove least recently used posters until the cache fits in max_bytes, sparing `keep`"""
+        entries, total = [], 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.jpg'):
+                stat = entry.stat()
+                # Kept posters count towards the size, they are only never deleted
+                total += stat.st_size
+                if entry.path not in keep:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            fetch_ms = np.array(self.fetch_seconds) * 1000
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'failures': self.failures,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'fetch_ms_mean': float(fetch_ms.mean()) if len(fetch_ms) else 0.0,
+                'fetch_ms_p95': float(np.percentile(fetch_ms, 95)) if len(fetch_ms) else 0.0,
+            }
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import artifacts
+from incremental import vectorize, add_movies, insert_movies, compact
+
+# Incremental inserts against a bundle built from the sample catalogue
+# pytest test_incremental.py
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'imdb_top_1000.csv')
+
+
+@pytest.fixture
+def bundle_dir(tmp_path, monkeypatch):
+    # Lowercased text instead of the NLTK pipeline, whose data is installed separately
+    monkeypatch.setattr(artifacts, 'combined_info', lambda movie_data: movie_data[artifacts.TEXT_COLUMNS]
+                        .astype(str).apply(lambda x: ' '.join(x).lower(), axis=1))
+    pd.read_csv(DATA).to_csv(tmp_path / 'movies.csv', index=False)
+    artifacts.build_bundle(str(tmp_path / 'movies.csv'), str(tmp_path / 'artifacts'), k=10)
+    return str(tmp_path / 'artifacts')
+
+
+def copies_of(bundle, rows):
+    return bundle.movie_data.iloc[rows].reset_index(drop=True)
+
+
+def score_against(bundle, row, other):
+    indices, scores = bundle.neighbour_index.row(row)
+    return scores[list(indices).index(other)] if other in indices else 0.0
+
+
+def test_inserted_duplicate_scores_one_against_original(bundle_dir):
+    bundle = artifacts.load_bundle(bundle_dir)
+    n_old = len(bundle.movie_data)
+    # max_features pruned some of these movies' terms at fit time, they are hashed for the copies
+    queries = vectorize(bundle.vectorizer, artifacts.combined_info(copies_of(bundle, [0, 1, 2])))
+    assert (queries.indices >= len(bundle.vectorizer.idf_)).any()
+
+    update = add_movies(bundle, copies_of(bundle, [0, 1, 2]))
+
+    for i, row in enumerate([0, 1, 2]):
+        assert score_against(bundle, n_old + i, row) == pytest.approx(1.0, abs=1e-5)
+        # the original is re-ranked with its copy first
+        assert row in update['patched_rows']
+        assert bundle.neighbour_index.row(row)[0][0] == n_old + i
+
+
+def test_added_movies_match_each_other_on_hashed_terms(bundle_dir):
+    bundle = artifacts.load_bundle(bundle_dir)
+    n_old = len(bundle.movie_data)
+
+    add_movies(bundle, copies_of(bundle, [5, 5]))
+
+    assert score_against(bundle, n_old, 5) == pytest.approx(1.0, abs=1e-5)
+    assert score_against(bundle, n_old, n_old + 1) == pytest.approx(1.0, abs=1e-5)
+
+
+def test_duplicate_scores_one_after_compaction(bundle_dir):
+    insert_movies(bundle_dir, copies_of(artifacts.load_bundle(bundle_dir), [3]))
+    compact(bundle_dir)
+    compacted = artifacts.load_bundle(bundle_dir)
+    n_old = len(compacted.movie_data)
+    assert n_old == 1001
+
+    # one copy of an original movie, one of the compacted copy with its hashed columns
+    add_movies(compacted, copies_of(compacted, [3, 1000]))
+
+    assert score_against(compacted, n_old, 3) == pytest.approx(1.0, abs=1e-5)
+    assert score_against(compacted, n_old + 1, 1000) == pytest.approx(1.0, abs=1e-5)
+
+
+def test_title_index_is_loaded_from_the_bundle_and_covers_added_movies(bundle_dir):
+    bundle = artifacts.load_bundle(bundle_dir)
+    # the persisted posting lists are memory-mapped, nothing is rebuilt
+    assert isinstance(bundle.title_index.gram_counts, np.memmap)
+    assert bundle.title_index.lookup(bundle.movie_data['Series_Title'][0]) == 0
+
+    insert_movies(bundle_dir, copies_of(bundle, [0]).assign(Series_Title='A Movie Added Later'))
+
+    bundle = artifacts.load_bundle(bundle_dir)
+    assert bundle.title_index.search('movie added later')[0] == len(bundle.movie_data) - 1
@@ -0,0 +1,129 @@
+import os
+import time
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+from PIL import Image
+
+from poster_cache import PosterCache
+
+# PosterCache against a local HTTP stub on 127.0.0.1 serving fixture images
+# pytest test_poster_cache.py
+
+
+class StubHandler(SimpleHTTPRequestHandler):
+    """Serves the fixture directory; /slow/... answers after a delay, counts requests in flight"""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            if self.path.startswith('/slow/'):
+                time.sleep(server.slow_seconds)
+                self.path = self.path[len('/slow'):]
+            else:
+                time.sleep(server.delay_seconds)
+            super().do_GET()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub(tmp_path):
+    images = tmp_path / 'images'
+    images.mkdir()
+    for i in range(6):
+        Image.new('RGB', (600, 900), (40 * i, 100, 200)).save(images / f'poster_{i}.jpg', 'JPEG')
+    (images / 'broken.jpg').write_bytes(b'not an image')
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), lambda *args: StubHandler(*args, directory=str(images)))
+    server.lock = threading.Lock()
+    server.requests = []
+    server.in_flight = 0
+    server.max_in_flight = 0
+    server.delay_seconds = 0.0
+    server.slow_seconds = 0.0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.base_url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def urls(stub, names):
+    return ['{}/{}'.format(stub.base_url, name) for name in names]
+
+
+def test_prefetch_stores_thumbnails(stub, tmp_path):
+    cache = PosterCache(str(tmp_path / 'cache'), size=(100, 150))
+    posters = urls(stub, ['poster_0.jpg', 'poster_1.jpg', 'poster_2.jpg'])
+
+    paths = cache.prefetch(posters + [posters[0], 'nan', ''])
+
+    assert set(paths) == set(posters)
+    for url, path in paths.items():
+        assert path == cache.path_for(url) and os.path.exists(path)
+        with Image.open(path) as image:
+            assert image.size == (100, 150)
+    assert len(stub.requests) == 3  # the duplicate URL is fetched once
+    assert cache.stats()['misses'] == 3
+
+
+def test_second_prefetch_is_served_from_cache(stub, tmp_path):
+    cache = PosterCache(str(tmp_path / 'cache'))
+    posters = urls(stub, ['poster_0.jpg', 'poster_1.jpg'])
+
+    first = cache.prefetch(posters)
+    second = cache.prefetch(posters)
+
+    assert first == second
+    assert len(stub.requests) == 2
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (2, 2, 0.5)
+
+
+def test_failed_and_timed_out_fetches_fall_back_to_none(stub, tmp_path):
+    stub.slow_seconds = 1.0
+    cache = PosterCache(str(tmp_path / 'cache'), timeout=0.2)
+    good, missing, broken, slow = urls(stub, ['poster_0.jpg', 'missing.jpg', 'broken.jpg', 'slow/poster_1.jpg'])
+
+    paths = cache.prefetch([good, missing, broken, slow])
+
+    assert os.path.exists(paths[good])
+    assert paths[missing] is None and paths[broken] is None and paths[slow] is None
+    assert cache.stats()['failures'] == 3
+    # failures are not cached, the next call tries again
+    assert cache.get(missing) is None and cache.get(slow) is None
+
+
+def test_concurrency_bounds_parallel_downloads(stub, tmp_path):
+    stub.delay_seconds = 0.1
+    cache = PosterCache(str(tmp_path / 'cache'), concurrency=2)
+
+    paths = cache.prefetch(urls(stub, ['poster_{}.jpg'.format(i) for i in range(6)]))
+
+    assert all(paths.values())
+    assert stub.max_in_flight == 2
+
+
+def test_eviction_counts_the_posters_it_keeps(stub, tmp_path):
+    cache = PosterCache(str(tmp_path / 'cache'))
+    first = cache.prefetch(urls(stub, ['poster_0.jpg', 'poster_1.jpg', 'poster_2.jpg']))
+    largest = max(os.path.getsize(path) for path in first.values())
+    cache.max_bytes = int(largest * 2.5)
+
+    second = cache.prefetch(urls(stub, ['poster_3.jpg', 'poster_4.jpg']))
+
+    # the new batch alone nearly fills the budget, so every older poster goes
+    assert all(os.path.exists(path) for path in second.values())
+    assert not any(os.path.exists(path) for path in first.values())
+    assert sum(entry.stat().st_size for entry in os.scandir(cache.cache_dir)) <= cache.max_bytes
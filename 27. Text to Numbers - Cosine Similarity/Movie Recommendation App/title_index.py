@@ -0,0 +1,144 @@
+import os
+import re
+import pickle
+from collections import defaultdict
+
+import numpy as np
+import unidecode
+
+
+def normalize_title(title):
+    """Lowercase ASCII words only, so "Amélie" and "amelie" look the same"""
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', unidecode.unidecode(str(title)).lower()).split())
+
+
+def trigrams(text):
+    # Two leading spaces make the first letters of a title their own trigrams,
+    # which is what lets short prefixes like "god" find "godfather"
+    padded = '  ' + text + ' '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """Exact hash lookup plus a character-trigram inverted index for fuzzy title search"""
+
+    # Files save() writes into an artifact bundle, the posting lists are memory-mapped back
+    FILES = ['title_normalized.pkl', 'title_grams.npy', 'title_offsets.npy', 'title_postings.npy',
+             'title_gram_counts.npy']
+
+    def __init__(self, titles=()):
+        self.titles = []
+        self.normalized_titles = []
+        self.exact = {}
+        self.normalized = {}
+        self.gram_counts = np.zeros(0, dtype=np.int32)
+        self.postings = {}
+        self.add(titles)
+
+    def add(self, titles):
+        """Index more titles, numbered after the ones already in the index"""
+        titles = list(titles)
+        first = len(self.titles)
+        normalized_titles = [normalize_title(title) for title in titles]
+
+        postings = defaultdict(list)
+        gram_counts = np.zeros(len(titles), dtype=np.int32)
+        for i, (title, norm) in enumerate(zip(titles, normalized_titles)):
+            # Duplicate titles keep their first row, like np.where(...)[0][0] did
+            self.exact.setdefault(title, first + i)
+            self.normalized.setdefault(norm, first + i)
+
+            grams = trigrams(norm)
+            gram_counts[i] = len(grams)
+            for gram in grams:
+                postings[gram].append(first + i)
+
+        for gram, rows in postings.items():
+            rows = np.array(rows, dtype=np.int32)
+            self.postings[gram] = np.concatenate([self.postings[gram], rows]) if gram in self.postings else rows
+        self.titles += titles
+        self.normalized_titles += normalized_titles
+        self.gram_counts = np.concatenate([self.gram_counts, gram_counts])
+        return self
+
+    def save(self, path):
+        """Write the index next to the other arrays of a bundle, all posting lists in one array"""
+        grams = sorted(self.postings)
+        lengths = [len(self.postings[gram]) for gram in grams]
+        with open(os.path.join(path, 'title_normalized.pkl'), 'wb') as f:
+            pickle.dump(self.normalized_titles, f, protocol=pickle.HIGHEST_PROTOCOL)
+        np.save(os.path.join(path, 'title_grams.npy'), np.array(grams, dtype='U3'))
+        np.save(os.path.join(path, 'title_offsets.npy'), np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+        np.save(os.path.join(path, 'title_postings.npy'),
+                np.concatenate([self.postings[gram] for gram in grams]) if grams else np.zeros(0, dtype=np.int32))
+        np.save(os.path.join(path, 'title_gram_counts.npy'), self.gram_counts)
+
+    @classmethod
+    def load(cls, path, titles, mmap_mode='r'):
+        """Index saved by save() for the same `titles`, without normalizing or splitting any title"""
+        index = cls()
+        index.titles = list(titles)
+        with open(os.path.join(path, 'title_normalized.pkl'), 'rb') as f:
+            index.normalized_titles = pickle.load(f)
+        if len(index.normalized_titles) != len(index.titles):
+            raise ValueError('Title index at {} has {} titles, expected {}'.format(
+                path, len(index.normalized_titles), len(index.titles)))
+
+        # Filled from the last row to the first, so duplicate titles keep their first row
+        rows = range(len(index.titles) - 1, -1, -1)
+        index.exact = dict(zip(reversed(index.titles), rows))
+        index.normalized = dict(zip(reversed(index.normalized_titles), rows))
+
+        grams = np.load(os.path.join(path, 'title_grams.npy'))
+        offsets = np.load(os.path.join(path, 'title_offsets.npy'))
+        postings = np.load(os.path.join(path, 'title_postings.npy'), mmap_mode=mmap_mode)
+        index.postings = {str(gram): postings[offsets[i]:offsets[i + 1]] for i, gram in enumerate(grams)}
+        index.gram_counts = np.load(os.path.join(path, 'title_gram_counts.npy'), mmap_mode=mmap_mode)
+        return index
+
+    def __len__(self):
+        return len(self.titles)
+
+    def lookup(self, title):
+        """Row of a title, exact match first, then ignoring case, accents and punctuation"""
+        row = self.exact.get(title)
+        if row is None:
+            row = self.normalized.get(normalize_title(title))
+        return row
+
+    def search(self, query, limit=10, min_score=0.2):
+        """Rows matching a typed query, best first: exact, then prefix, then by trigram similarity"""
+        norm = normalize_title(query)
+        if not norm:
+            return []
+
+        grams = trigrams(norm)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return []
+
+        # Shared trigrams per title in one vectorised pass over the posting lists
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.titles))
+        candidates = np.flatnonzero(shared)
+
+        # Keep the titles sharing the most trigrams, so long titles that merely start
+        # with a short query are not crowded out before the prefix check below
+        if len(candidates) > limit * 20:
+            best = np.argpartition(-shared[candidates], limit * 20)[:limit * 20]
+            candidates = candidates[best]
+
+        # Dice coefficient between the query and title trigram sets
+        scores = 2.0 * shared[candidates] / (len(grams) + self.gram_counts[candidates])
+
+        ranked = []
+        for row, score in zip(candidates, scores):
+            title = self.normalized_titles[row]
+            if title == norm:
+                score += 2.0
+            elif title.startswith(norm) or (' ' + norm) in title:
+                score += 1.0
+            if score >= min_score:
+                ranked.append((-score, row))
+        ranked.sort()
+
+        return [int(row) for _, row in ranked[:limit]]
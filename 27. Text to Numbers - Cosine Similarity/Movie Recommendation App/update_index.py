@@ -0,0 +1,28 @@
+import argparse
+
+import pandas as pd
+
+from incremental import insert_movies, compact
+
+# Adds movies to the latest bundle without a refit, or folds the added movies into a new revision
+# python update_index.py add new_movies.csv
+# python update_index.py compact
+# A full refit (new vocabulary and idf) is a regular build: python build_index.py
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Incrementally update the movie recommender bundle')
+    parser.add_argument('command', choices=['add', 'compact'])
+    parser.add_argument('data', nargs='?', help='CSV with the new movies, same columns as imdb_top_1000.csv')
+    parser.add_argument('--artifacts', default='artifacts', help='Artifacts directory or bundle path')
+    args = parser.parse_args()
+
+    if args.command == 'add':
+        if not args.data:
+            parser.error('add needs a CSV of new movies')
+        bundle, update, seconds = insert_movies(args.artifacts, pd.read_csv(args.data))
+        print(f"Added {len(update['movies'])} movies in {seconds * 1000:.1f} ms, "
+              f"re-ranked {len(update['patched_rows'])} existing movies "
+              f"({len(bundle.movie_data)} movies in the catalogue)")
+    else:
+        path, manifest = compact(args.artifacts)
+        print(f"Compacted into {manifest['bundle_id']} with {manifest['movies']} movies -> {path}")
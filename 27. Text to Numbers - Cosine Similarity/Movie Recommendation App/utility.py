@@ -1,20 +1,46 @@
 import re
+import time
+import string
+import argparse
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 import unidecode
 from bs4 import BeautifulSoup
 from nltk.corpus import stopwords
 from nltk.stem import PorterStemmer, WordNetLemmatizer
 from nltk.tokenize import word_tokenize
-from nltk import download
 import contractions
-import nltk
-nltk.download('wordnet')
-download('punkt')
-download('stopwords')
-download('omw-1.4')
+import nltk_resources  # points NLTK at the local data directory, no downloads at import
+
+# Upper bound on the distinct tokens whose lemma is memoized per process
+LEMMA_CACHE_SIZE = 200000
+
+@lru_cache(maxsize=None)
+def _resources():
+    # Stopwords, stemmer and lemmatizer are built once per process, not once per document
+    nltk_resources.require('stopwords', 'wordnet', 'punkt_tab')
+    stop_words = set(stopwords.words('english'))
+    stemmer = PorterStemmer()
+    lemmatizer = WordNetLemmatizer()
+
+    # Step 7 below has always stemmed the joined text one character at a time, so it is
+    # a per-character mapping. It is computed once here and applied with str.translate,
+    # which keeps the output identical to calling the stemmer on every character.
+    alphabet = string.ascii_lowercase + string.digits + ' '
+    char_stems = str.maketrans({c: stemmer.stem(c) for c in alphabet if stemmer.stem(c) != c})
+
+    return stop_words, char_stems, lemmatizer
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def _lemmatize(word):
+    return _resources()[2].lemmatize(word)
 
 def preprocess_text(text):
-    # 1. Remove HTML
-    text = BeautifulSoup(text, "html.parser").get_text()
+    stop_words, char_stems, _ = _resources()
+
+    # 1. Remove HTML (text without tags or entities comes back unchanged from the parser)
+    if '<' in text or '&' in text:
+        text = BeautifulSoup(text, "html.parser").get_text()
 
     # 2. Remove contradictions - assuming this means handling contractions (e.g., "don't" -> "do not")
     text = contractions.fix(text)
@@ -29,20 +55,16 @@ def preprocess_text(text):
     text = text.lower()
     
     # 6. Remove stopwords
-    stop_words = set(stopwords.words('english'))
     word_tokens = word_tokenize(text)
     filtered_text = [word for word in word_tokens if word not in stop_words]
     text = ' '.join(filtered_text)
     
     
     # 7. Stemming
-    stemmer = PorterStemmer()
-    stemmed_text = [stemmer.stem(word) for word in text]
-    text = ''.join(stemmed_text)
+    text = text.translate(char_stems)
 
     # 8. Lemmatization
-    lemmatizer = WordNetLemmatizer()
-    lemmatized_text = [lemmatizer.lemmatize(word) for word in text.split(' ')]
+    lemmatized_text = [_lemmatize(word) for word in text.split(' ')]
     
     # Optional: Combine stemming and lemmatization
     # It's generally not recommended to use both, but if needed, uncomment the following lines:
@@ -53,4 +75,41 @@ def preprocess_text(text):
     # If only lemmatization is needed:
     text = ' '.join(lemmatized_text)
     
-    return text
\ No newline at end of file
+    return text
+
+def _preprocess_chunk(texts):
+    return [preprocess_text(text) for text in texts]
+
+def preprocess_batch(texts, workers=None, chunk_size=256, report=True):
+    """Preprocess many documents in a process pool, same output as preprocess_text per document"""
+    texts = list(texts)
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+
+    start = time.time()
+    if workers == 1 or len(chunks) <= 1:
+        results = [_preprocess_chunk(chunk) for chunk in chunks]
+    else:
+        # Each worker builds its resources once and keeps its own lemma cache
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_preprocess_chunk, chunks))
+    elapsed = time.time() - start
+
+    processed = [text for chunk in results for text in chunk]
+    if report:
+        print(f'Preprocessed {len(processed)} documents in {elapsed:.2f}s '
+              f'({len(processed) / max(elapsed, 1e-9):.0f} docs/sec)')
+    return processed
+
+if __name__ == '__main__':
+    # Measure preprocessing throughput, e.g. python utility.py --data imdb_top_1000.csv
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description='Measure preprocessing throughput in docs/sec')
+    parser.add_argument('--data', default='imdb_top_1000.csv')
+    parser.add_argument('--column', default='Overview')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-size', type=int, default=256)
+    args = parser.parse_args()
+
+    texts = pd.read_csv(args.data)[args.column].astype(str).tolist()
+    preprocess_batch(texts, workers=args.workers, chunk_size=args.chunk_size)
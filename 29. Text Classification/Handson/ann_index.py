@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+# Each project folder is run on its own (streamlit run app.py from the folder), so this module
+# is kept as a copy, identical apart from this note, in
+# "27. Text to Numbers - Cosine Similarity/Movie Recommendation App/ann_index.py"; change both.
+
+
+class LSHIndex:
+    """Approximate cosine nearest neighbours with random-projection (SimHash) LSH
+
+    Every table hashes a vector to the signs of `n_bits` random projections, so
+    vectors with a small angle between them tend to land in the same bucket.
+    A query collects the rows of its bucket in each table (plus the buckets one
+    bit flip away when `multiprobe` is on) and ranks only those candidates by
+    exact cosine similarity. Works on dense arrays and on sparse TF-IDF rows.
+    """
+
+    def __init__(self, n_tables=8, n_bits=12, multiprobe=True, seed=0):
+        if not 1 <= n_bits <= 30:
+            raise ValueError('n_bits must be between 1 and 30')
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.multiprobe = multiprobe
+        self.seed = seed
+
+        self.vectors = None
+        self.planes = None
+        self.order = None
+        self.sorted_codes = None
+
+    def __len__(self):
+        return 0 if self.vectors is None else self.vectors.shape[0]
+
+    def _codes(self, vectors):
+        """Bucket code of every row in every table, shape (rows, n_tables)"""
+        projected = vectors @ self.planes
+        projected = np.asarray(projected.toarray() if sparse.issparse(projected) else projected)
+        bits = (projected > 0).reshape(-1, self.n_tables, self.n_bits)
+        return bits.astype(np.int64) @ (1 << np.arange(self.n_bits, dtype=np.int64))
+
+    def build(self, vectors):
+        vectors = normalize(vectors).astype(np.float32)
+        rng = np.random.default_rng(self.seed)
+        self.planes = rng.standard_normal((vectors.shape[1], self.n_tables * self.n_bits)).astype(np.float32)
+        self.vectors = sparse.csr_matrix(vectors) if sparse.issparse(vectors) else np.ascontiguousarray(vectors)
+
+        # One sorted copy of the codes per table, a bucket is then a searchsorted range
+        codes = self._codes(self.vectors).T
+        self.order = np.argsort(codes, axis=1, kind='stable').astype(np.int32)
+        self.sorted_codes = np.take_along_axis(codes, self.order, axis=1)
+        return self
+
+    def candidates(self, code):
+        """Rows sharing a bucket with `code` (one code per table) in any table"""
+        probes = code[:, None]
+        if self.multiprobe:
+            flips = 1 << np.arange(self.n_bits, dtype=np.int64)
+            probes = np.hstack([probes, code[:, None] ^ flips[None, :]])
+
+        found = []
+        for table in range(self.n_tables):
+            lo = np.searchsorted(self.sorted_codes[table], probes[table], side='left')
+            hi = np.searchsorted(self.sorted_codes[table], probes[table], side='right')
+            found.extend(self.order[table, start:end] for start, end in zip(lo, hi) if end > start)
+        if not found:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(found))
+
+    def _rank(self, query, rows, k, exclude):
+        sims = self.vectors[rows] @ query.T
+        sims = np.asarray(sims.toarray() if sparse.issparse(sims) else sims, dtype=np.float32).ravel()
+        if exclude is not None:
+            sims[rows == exclude] = -np.inf
+        k = min(k, len(rows))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind='stable')]
+        keep = np.isfinite(sims[top])
+        return rows[top][keep], sims[top][keep]
+
+    def query(self, vectors, k=10, exclude=None):
+        """Return (row indices, cosine scores) of the k nearest rows for each query row, best first.
+
+        `exclude` optionally gives, per query, a row that must not be returned
+        (e.g. the query's own row when building a neighbour index).
+        Queries with fewer than k candidates fall back to an exact scan.
+        """
+        vectors = normalize(vectors).astype(np.float32)
+        codes = self._codes(vectors)
+        results = []
+        for i, code in enumerate(codes):
+            query = vectors[i]
+            skip = None if exclude is None else exclude[i]
+            rows = self.candidates(code)
+            if len(rows) < k + (skip is not None):
+                rows = np.arange(len(self), dtype=np.int32)
+            results.append(self._rank(query, rows, k, skip))
+        return results
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        meta = {'n_tables': self.n_tables, 'n_bits': self.n_bits, 'multiprobe': self.multiprobe,
+                'seed': self.seed, 'sparse': sparse.issparse(self.vectors),
+                'shape': list(self.vectors.shape)}
+        np.save(os.path.join(path, 'planes.npy'), self.planes)
+        np.save(os.path.join(path, 'order.npy'), self.order)
+        np.save(os.path.join(path, 'sorted_codes.npy'), self.sorted_codes)
+        if meta['sparse']:
+            for name in ('data', 'indices', 'indptr'):
+                np.save(os.path.join(path, 'vectors_{}.npy'.format(name)), getattr(self.vectors, name))
+        else:
+            np.save(os.path.join(path, 'vectors.npy'), self.vectors)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load a saved index, memory-mapping the arrays so queries page in only what they touch"""
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        index = cls(meta['n_tables'], meta['n_bits'], meta['multiprobe'], meta['seed'])
+
+        def array(name):
+            return np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+
+        index.planes = array('planes')
+        index.order = array('order')
+        index.sorted_codes = array('sorted_codes')
+        if meta['sparse']:
+            index.vectors = sparse.csr_matrix(
+                (array('vectors_data'), array('vectors_indices'), array('vectors_indptr')),
+                shape=tuple(meta['shape']))
+        else:
+            index.vectors = array('vectors')
+        return index
+
+
+def exact_top_k(vectors, queries, k=10):
+    """Brute-force cosine top-k over L2 normalised `vectors`, the reference for the benchmark"""
+    sims = normalize(queries).astype(np.float32) @ vectors.T
+    sims = np.asarray(sims.toarray() if sparse.issparse(sims) else sims)
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1), axis=1)
+
+
+def benchmark(index, vectors, queries, k=10):
+    """Recall@k of the index against the exact answer, plus per-query latencies of both"""
+    ann_ms, exact_ms, recalls = [], [], []
+    reference = normalize(vectors).astype(np.float32)
+    for i in range(queries.shape[0]):
+        query = queries[i:i + 1]
+
+        start = time.perf_counter()
+        expected = exact_top_k(reference, query, k)[0]
+        exact_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        found, _ = index.query(query, k)[0]
+        ann_ms.append((time.perf_counter() - start) * 1000)
+
+        recalls.append(len(np.intersect1d(found, expected)) / k)
+
+    return {
+        'rows': len(index), 'queries': queries.shape[0], 'k': k,
+        'recall': float(np.mean(recalls)),
+        'ann_ms_p50': float(np.percentile(ann_ms, 50)), 'ann_ms_p95': float(np.percentile(ann_ms, 95)),
+        'exact_ms_p50': float(np.percentile(exact_ms, 50)), 'exact_ms_p95': float(np.percentile(exact_ms, 95)),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recall and latency of the LSH index against exact search')
+    parser.add_argument('--vectors', help='.npy file of dense vectors (default: synthetic clustered data)')
+    parser.add_argument('-n', type=int, default=100000, help='Synthetic rows')
+    parser.add_argument('--dim', type=int, default=100, help='Synthetic dimensions')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--tables', type=int, default=8)
+    parser.add_argument('--bits', type=int, default=12)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    if args.vectors:
+        vectors = np.load(args.vectors, mmap_mode='r')
+    else:
+        centers = rng.standard_normal((args.n // 50, args.dim))
+        vectors = centers[rng.integers(0, len(centers), args.n)] + 0.5 * rng.standard_normal((args.n, args.dim))
+    queries = vectors[rng.choice(vectors.shape[0], args.queries, replace=False)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape)
+
+    start = time.time()
+    index = LSHIndex(args.tables, args.bits).build(vectors)
+    print(f'Built {args.tables}x{args.bits}-bit index over {len(index)} rows in {time.time() - start:.2f}s')
+    print(json.dumps(benchmark(index, vectors, queries, args.k), indent=2))
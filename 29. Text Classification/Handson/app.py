@@ -3,77 +3,71 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import joblib
+import os
 
 #from utils import preprocess_text
 
-import nltk
 from nltk.tokenize import word_tokenize
 
-nltk.download('punkt')
+# tokenizer, stopwords (remove common words like "the,is,and,etc") and wordnet (lemmatization)
+# come from the local NLTK data directory, run `python nltk_resources.py` once to install them
+import nltk_resources
+nltk_resources.require('punkt_tab', 'stopwords', 'wordnet')
 
-# remove common words like "the,is,and,etc'
-nltk.download('stopwords')
-
-# do lemmatization
-nltk.download('wordnet')
-
-nltk.download('punkt_tab')
-
-from gensim.models import Word2Vec #addfor w2v
 #from utils import preprocess_text , get_word2vec_embeddings #addfor w2v
 from utils import preprocess_text, get_word2vec_embeddings, get_glove_embeddings, get_fasttext_embeddings #add glov,ft
 
-from sklearn.metrics.pairwise import cosine_similarity #addfor recom
-from textblob import TextBlob #addfor sentiment
-from gensim.models import KeyedVectors #add glove
-import fasttext
+from ann_index import LSHIndex #addfor recom
+from sentiment import SentimentScorer #addfor sentiment
+import feature_store
+from model_registry import ModelRegistry
 
 @st.cache_resource
-def load_models():
+def load_registry():
+    """Models are loaded per feature type on first use, within $MODEL_MEMORY_MB"""
+    registry = ModelRegistry(memory_budget_mb=int(os.environ.get('MODEL_MEMORY_MB', 2048)))
+    registry.get('tfidf') # the default feature type, everything else waits until it is selected
+    return registry
 
-    tfidf_vectorizer = joblib.load('tfidf_vectorizer.pkl')
-    lr_model_tfidf = joblib.load('lr_model_tfidf.pkl')
+@st.cache_resource
+def load_data():
     tgt_names = joblib.load('target_names.pkl')
-
     data = pd.read_csv('preprocessed_data.csv')
+    return tgt_names, data
 
-    w2v_model = Word2Vec.load('word2vec.model') #addfor w2v
-    lr_model_word2vec = joblib.load('lr_model_word2vec.pkl') #addfor w2v
-
-    gbc_model_tfidf = joblib.load('gbc_model_tfidf.pkl') #addfor gbc
-    gbc_model_word2vec = joblib.load('gbc_model_word2vec.pkl') #addfor gbc
-
-    lr_model_glove = joblib.load('lr_model_glove.pkl') #add for glv ft blk
-    gbc_model_glove = joblib.load('gbc_model_glove.pkl')
-    lr_model_fasttext = joblib.load('lr_model_fasttext.pkl')
-    gbc_model_fasttext = joblib.load('gbc_model_fasttext.pkl')
-
-    glove_model = KeyedVectors.load_word2vec_format('glove.6B.50d.txt', binary=False, no_header=True)
-    ft_model = fasttext.load_model('fasttext.model')
-
-
-    X_tfidf = tfidf_vectorizer.transform(data['claened_text'])
-    tokenized_texts = [word_tokenize(text) for text in data['claened_text']]
-
-    X_w2v = np.array([get_word2vec_embeddings(text, w2v_model) for text in tokenized_texts]) #addfor w2v
+@st.cache_resource
+def load_features(feature_name):
+    """Corpus features of one type, memory-mapped from the feature store (rebuilt only if stale)"""
+    return feature_store.load_features('preprocessed_data.csv', registry.embedding, names=[feature_name],
+                                       data=data)[feature_name]
 
-    X_glove = np.array([get_glove_embeddings(text, glove_model) for text in tokenized_texts]) #add blk glv, tf
-    X_ft = np.array([get_fasttext_embeddings(" ".join(tokens), ft_model) for tokens in tokenized_texts])
-    X_features = {'tfidf': X_tfidf, 'word2vec': X_w2v, 'glove': X_glove, 'fasttext': X_ft}
 
-    #X_features = {'tfidf': X_tfidf}
-    #X_features = {'tfidf': X_tfidf, 'word2vec': X_w2v} #addfor w2v
+@st.cache_resource
+def load_sentiment_scorer():
+    """Shared by all sessions, so a repeated post is scored once (the memo keeps the last MEMO_SIZE scores)"""
+    return SentimentScorer(workers=1)
 
 
+registry = load_registry()
+tgt_names, data = load_data()
 
-    return(tfidf_vectorizer, lr_model_tfidf, w2v_model, lr_model_word2vec, glove_model, ft_model,
-           lr_model_glove, gbc_model_glove, lr_model_fasttext, gbc_model_fasttext,
-           gbc_model_tfidf, gbc_model_word2vec, tgt_names, data, X_features) #addfor w2v, glv, ft
 
+@st.cache_resource
+def load_ann_index(feature_name):
+    """LSH index over one feature matrix so recommendations do not scan the whole corpus
 
-tfidf_vectorizer, lr_model_tfidf, w2v_model, lr_model_word2vec, glove_model, ft_model, \
-lr_model_glove, gbc_model_glove, lr_model_fasttext, gbc_model_fasttext, \
-gbc_model_tfidf, gbc_model_word2vec, tgt_names, data, X_features = load_models() #addfor w2v, glv,ft
+    Built once per version of the features and saved under ann_index/, later starts
+    memory-map the saved index instead of hashing the corpus again.
+    """
+    vectors = load_features(feature_name)
+    # sparse TF-IDF rows are far less similar to each other than dense embeddings,
+    # so they get more tables with shorter codes
+    n_tables, n_bits = (16, 6) if feature_name == 'tfidf' else (8, 12)
+    feature_hash = feature_store.read_manifest(feature_store.STORE_DIR)['features'][feature_name]['input_hash']
+    path = os.path.join('ann_index', '{}_{}x{}_{}'.format(feature_name, n_tables, n_bits, feature_hash[:16]))
+    if not os.path.exists(os.path.join(path, 'meta.json')):  # meta.json is written last
+        LSHIndex(n_tables=n_tables, n_bits=n_bits).build(vectors).save(path)
+    return LSHIndex.load(path, mmap_mode='r')
 
 
 
@@ -95,22 +89,18 @@ if st.button("Analyze"):
       cleaned_input  = preprocess_text(user_input)
       tokenized_input = word_tokenize(cleaned_input)#add w2v
 
+      # only the selected feature type's vectorizer and classifiers are loaded
+      models = registry.get(feature_type.lower())
+      lr_model = models.lr
+      gbc_model = models.gbc # add gbc
       if feature_type == "TFIDF":
-          X_input = tfidf_vectorizer.transform([cleaned_input])
-          lr_model = lr_model_tfidf
-          gbc_model = gbc_model_tfidf # add gbc
+          X_input = models.embedding.transform([cleaned_input])
       elif feature_type == "Word2Vec":  # add w2v blk
-            X_input = np.array([get_word2vec_embeddings(tokenized_input, w2v_model)])
-            lr_model = lr_model_word2vec
-            gbc_model = gbc_model_word2vec # add gbc
+            X_input = np.array([get_word2vec_embeddings(tokenized_input, models.embedding)])
       elif feature_type == "GloVe": #add glv blk
-            X_input = np.array([get_glove_embeddings(tokenized_input, glove_model)])
-            lr_model = lr_model_glove
-            gbc_model = gbc_model_glove
+            X_input = np.array([get_glove_embeddings(tokenized_input, models.embedding)])
       else:  # FastText #add ft blk
-            X_input = np.array([get_fasttext_embeddings(cleaned_input, ft_model)])
-            lr_model = lr_model_fasttext
-            gbc_model = gbc_model_fasttext
+            X_input = np.array([get_fasttext_embeddings(cleaned_input, models.embedding)])
       if task ==  "Classification":
           lr_pred = lr_model.predict(X_input)[0]
 
@@ -120,15 +110,14 @@ if st.button("Analyze"):
           gbc_pred = gbc_model.predict(X_input)[0] #addfor gbc
           st.write(f'GBC Prediction: {tgt_names[gbc_pred]}') #addfor gbc
       elif task == "Recommendation": #addfor recom  blk
-          sim_scores = cosine_similarity(X_input, X_features[feature_type.lower()])
-          top_indices = sim_scores[0].argsort()[-5:][::-1]
+          top_indices, _ = load_ann_index(feature_type.lower()).query(X_input, k=5)[0]
           st.subheader("Top 5 Similar Documents")
           for idx in top_indices:
               st.write(f"**Category**: {data['category_name'][idx]}")
               st.write(f"**Text**: {data['text'][idx]}") #[:200]}...")
               st.write("---")
       elif task == "Sentiment Analysis": #addfor sentiment block
-          sentiment = TextBlob(cleaned_input).sentiment.polarity
+          sentiment = load_sentiment_scorer().score([cleaned_input])['polarity'][0]
           st.subheader("Sentiment Analysis Result")
           st.write(f"Sentiment Polarity: {sentiment:.4f}")
           st.write("Positive" if sentiment > 0 else "Negative" if sentiment < 0 else "Neutral")
@@ -136,3 +125,7 @@ if st.button("Analyze"):
     st.error('Please enter some text')
 
 
+with st.sidebar.expander("Loaded models"):
+    st.dataframe(pd.DataFrame(registry.stats()), hide_index=True)
+    st.caption(f"{registry.total_bytes() / 2 ** 20:.0f} MB of {registry.memory_budget / 2 ** 20:.0f} MB budget, "
+               f"{registry.evictions} evictions")
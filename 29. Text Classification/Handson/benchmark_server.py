@@ -0,0 +1,45 @@
+import json
+import time
+import argparse
+import urllib.request
+
+import pandas as pd
+
+# Documents per second of /classify/batch by batch size, against a running server
+# uvicorn server:app --port 8000
+# python benchmark_server.py --url http://localhost:8000 --feature-type tfidf
+
+
+def post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Throughput of the classification service by batch size')
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--data', default='preprocessed_data.csv', help='CSV with the raw `text` column')
+    parser.add_argument('--feature-type', default='tfidf')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 128, 512])
+    parser.add_argument('--docs', type=int, default=1024, help='Documents sent per batch size')
+    args = parser.parse_args()
+
+    texts = pd.read_csv(args.data)['text'].dropna().astype(str).tolist()[:args.docs]
+    # Warm up, so model loading is not counted
+    post(args.url + '/classify', {'text': texts[0], 'feature_type': args.feature_type})
+
+    print(f"{'batch':>6} {'docs/s':>9} {'preprocess':>11} {'vectorize':>10} {'score':>8}  (ms per batch)")
+    for batch_size in args.batch_sizes:
+        timings = []
+        start = time.perf_counter()
+        for i in range(0, len(texts), batch_size):
+            response = post(args.url + '/classify/batch',
+                            {'texts': texts[i:i + batch_size], 'feature_type': args.feature_type})
+            timings.append(response['timings'])
+        seconds = time.perf_counter() - start
+
+        mean = pd.DataFrame(timings).mean()
+        print(f"{batch_size:>6} {len(texts) / seconds:>9.1f} {mean['preprocess_ms']:>11.1f} "
+              f"{mean['vectorize_ms']:>10.1f} {mean['score_ms']:>8.1f}")
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from nltk.tokenize import word_tokenize
+
+import nltk_resources  # use the local NLTK data directory
+from utils import get_fasttext_embeddings, embed_documents
+
+# Corpus feature matrices computed once and memory-mapped by the app at startup.
+# Each feature records the hashes of the corpus and the model it was computed from,
+# and is rebuilt automatically when either changes.
+# python feature_store.py --data preprocessed_data.csv --out features
+FEATURE_VERSION = 1
+STORE_DIR = 'features'
+TEXT_COLUMN = 'claened_text'
+
+# Feature name -> model file it is computed with
+MODEL_FILES = {
+    'tfidf': 'tfidf_vectorizer.pkl',
+    'word2vec': 'word2vec.model',
+    'glove': 'glove.6B.50d.txt',
+    'fasttext': 'fasttext.model',
+}
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_hash(path, known=None):
+    """sha256 of a file, reusing `known` (from the manifest) while size and mtime are unchanged"""
+    stat = os.stat(path)
+    if known and known.get('size') == stat.st_size and known.get('mtime_ns') == stat.st_mtime_ns:
+        return known
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': _sha256(path)}
+
+
+def input_hash(data_sha, model_sha):
+    return hashlib.sha256('{}:{}:{}'.format(FEATURE_VERSION, data_sha, model_sha).encode()).hexdigest()
+
+
+def model_hash(name, files):
+    """sha256 of the model a feature is computed with, `files` is the manifest's file hash cache"""
+    model_files = [MODEL_FILES[name]]
+    if name == 'glove':
+        # GloVe features come from the converted vectors at $GLOVE_VECTORS (the full or a
+        # pruned vocabulary). A deployment may ship only those, the text file is only
+        # needed, and keyed on, until the first conversion
+        import glove_vectors
+        converted = glove_vectors.converted_files()
+        if all(os.path.exists(path) for path in converted):
+            model_files = converted
+
+    digest = hashlib.sha256()
+    for model_file in model_files:
+        files[model_file] = file_hash(model_file, files.get(model_file))
+        digest.update(files[model_file]['sha256'].encode())
+    return digest.hexdigest() if len(model_files) > 1 else files[model_files[0]]['sha256']
+
+
+def feature_path(store_dir, name):
+    return os.path.join(store_dir, name + ('.npz' if name == 'tfidf' else '.npy'))
+
+
+def compute_feature(name, texts, tokenized_texts, model):
+    if name == 'tfidf':
+        return model.transform(texts).tocsr().astype(np.float32)
+    if name in ('word2vec', 'glove'):
+        return embed_documents(tokenized_texts, model).astype(np.float32, copy=False)
+    # FastText sentence vectors are normalised per word inside the library, not a plain mean
+    vectors = [get_fasttext_embeddings(" ".join(tokens), model) for tokens in tokenized_texts]
+    return np.array(vectors, dtype=np.float32)
+
+
+def write_feature(store_dir, name, matrix):
+    """Write one feature matrix atomically, sparse TF-IDF as an uncompressed .npz, dense as .npy"""
+    path = feature_path(store_dir, name)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        if sparse.issparse(matrix):
+            sparse.save_npz(f, matrix, compressed=False)
+        else:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_feature(store_dir, name, mmap_mode='r'):
+    path = feature_path(store_dir, name)
+    if name == 'tfidf':
+        return sparse.load_npz(path).tocsr()
+    # Dense embeddings are paged in on demand and shared between processes
+    return np.load(path, mmap_mode=mmap_mode)
+
+
+def read_manifest(store_dir):
+    try:
+        with open(os.path.join(store_dir, 'manifest.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'files': {}, 'features': {}}
+
+
+def write_manifest(store_dir, manifest):
+    tmp_path = os.path.join(store_dir, 'manifest.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(store_dir, 'manifest.json'))
+
+
+def load_features(data_path, get_model, names=tuple(MODEL_FILES), store_dir=STORE_DIR, data=None):
+    """Return {feature name: matrix}, rebuilding only the features whose inputs changed.
+
+    `get_model(name)` is only called for features that have to be (re)computed,
+    so a warm start never touches the embedding models.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = read_manifest(store_dir)
+    files = manifest.setdefault('files', {})
+    features = manifest.setdefault('features', {})
+
+    files[data_path] = file_hash(data_path, files.get(data_path))
+    stale = []
+    for name in names:
+        expected = input_hash(files[data_path]['sha256'], model_hash(name, files))
+        if features.get(name, {}).get('input_hash') != expected \
+                or not os.path.exists(feature_path(store_dir, name)):
+            stale.append((name, expected))
+
+    if stale:
+        data = pd.read_csv(data_path) if data is None else data
+        texts = data[TEXT_COLUMN].fillna('').astype(str)
+        tokenized_texts = [word_tokenize(text) for text in texts]
+        for name, expected in stale:
+            start = time.time()
+            model = get_model(name)
+            # loading GloVe converts its vectors on first use, which changes their key
+            expected = input_hash(files[data_path]['sha256'], model_hash(name, files))
+            matrix = compute_feature(name, texts, tokenized_texts, model)
+            write_feature(store_dir, name, matrix)
+            features[name] = {'input_hash': expected, 'shape': list(matrix.shape),
+                              'dtype': str(matrix.dtype), 'build_seconds': round(time.time() - start, 3)}
+
+    write_manifest(store_dir, manifest)
+    return {name: read_feature(store_dir, name) for name in names}
+
+
+def load_model(name):
+    """Load the model a feature is computed with, from its file in MODEL_FILES"""
+    path = MODEL_FILES[name]
+    if name == 'tfidf':
+        import joblib
+        return joblib.load(path)
+    if name == 'word2vec':
+        from gensim.models import Word2Vec
+        return Word2Vec.load(path)
+    if name == 'glove':
+        import glove_vectors
+        return glove_vectors.load(text_path=path)
+    import fasttext
+    return fasttext.load_model(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or refresh the corpus feature store')
+    parser.add_argument('--data', default='preprocessed_data.csv', help='Preprocessed corpus CSV')
+    parser.add_argument('--out', default=STORE_DIR, help='Feature store directory')
+    parser.add_argument('--features', nargs='+', default=list(MODEL_FILES), choices=list(MODEL_FILES))
+    args = parser.parse_args()
+
+    start = time.time()
+    X_features = load_features(args.data, load_model, args.features, args.out)
+    manifest = read_manifest(args.out)
+    for name, matrix in X_features.items():
+        info = manifest['features'][name]
+        print(f"{name:<9} {str(tuple(info['shape'])):<16} {info['dtype']:<8} "
+              f"built in {info['build_seconds']:.2f}s")
+    print(f'Feature store up to date in {time.time() - start:.2f}s -> {args.out}')
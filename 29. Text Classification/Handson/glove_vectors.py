@@ -0,0 +1,79 @@
+import os
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+from gensim.models import KeyedVectors
+
+# GloVe converted once from the 400k line text file to gensim's native format:
+# the vocabulary (key -> row hash index) is a small pickle and the vectors are a
+# float32 .npy that is memory-mapped, so loading is near instant and the pages are
+# shared by every process that maps them.
+# python glove_vectors.py                 (full vocabulary)
+# python glove_vectors.py --prune preprocessed_data.csv
+GLOVE_TEXT = 'glove.6B.50d.txt'
+GLOVE_DIR = 'glove'
+GLOVE_PATH = os.environ.get('GLOVE_VECTORS', os.path.join(GLOVE_DIR, 'glove.6B.50d.kv'))
+PRUNED_PATH = os.path.join(GLOVE_DIR, 'glove.6B.50d.pruned.kv')
+
+
+def corpus_vocabulary(data_path, column='claened_text'):
+    """Distinct tokens of the preprocessed corpus (its text is already lowercased and space separated)"""
+    vocabulary = set()
+    for text in pd.read_csv(data_path, usecols=[column])[column].dropna():
+        vocabulary.update(str(text).split())
+    return vocabulary
+
+
+def prune(vectors, vocabulary):
+    """Copy of `vectors` restricted to the keys in `vocabulary`, keeping the original order"""
+    keys = [key for key in vectors.index_to_key if key in vocabulary]
+    pruned = KeyedVectors(vectors.vector_size, dtype=np.float32)
+    pruned.add_vectors(keys, vectors[keys])
+    return pruned
+
+
+def convert(text_path=GLOVE_TEXT, out_path=GLOVE_PATH, vocabulary=None):
+    vectors = KeyedVectors.load_word2vec_format(text_path, binary=False, no_header=True)
+    if vocabulary is not None:
+        vectors = prune(vectors, vocabulary)
+    vectors.vectors = vectors.vectors.astype(np.float32, copy=False)
+
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    # sep_limit=0 always stores the vectors as a separate .npy, even for a small pruned
+    # vocabulary, otherwise they would be pickled inline and could not be memory-mapped
+    vectors.save(out_path, sep_limit=0)
+    return vectors
+
+
+def converted_files(path=GLOVE_PATH):
+    """Resolved paths of the vocabulary and the vectors .npy of a converted KeyedVectors file"""
+    path = os.path.realpath(path)
+    return [path, path + '.vectors.npy']
+
+
+def load(path=GLOVE_PATH, text_path=GLOVE_TEXT):
+    """Memory-mapped GloVe vectors, converting the text file on first use"""
+    if not os.path.exists(path):
+        convert(text_path, path)
+    return KeyedVectors.load(path, mmap='r')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert GloVe text vectors to a memory-mapped format')
+    parser.add_argument('--text', default=GLOVE_TEXT, help='GloVe text file')
+    parser.add_argument('--out', help='Output path (default: {} or {} with --prune)'.format(GLOVE_PATH, PRUNED_PATH))
+    parser.add_argument('--prune', metavar='CSV', help='Keep only tokens that occur in this preprocessed corpus')
+    args = parser.parse_args()
+
+    vocabulary = corpus_vocabulary(args.prune) if args.prune else None
+    out_path = args.out or (PRUNED_PATH if args.prune else GLOVE_PATH)
+
+    start = time.time()
+    vectors = convert(args.text, out_path, vocabulary)
+    print(f'Parsed and converted {len(vectors)} vectors in {time.time() - start:.2f}s -> {out_path}')
+
+    start = time.time()
+    vectors = load(out_path)
+    print(f'Memory-mapped load took {time.time() - start:.3f}s')
@@ -0,0 +1,92 @@
+import os
+import time
+import threading
+from collections import OrderedDict, namedtuple
+
+import joblib
+
+import feature_store
+
+# Feature type -> (LR classifier, GBC classifier) trained on it, the embedding model
+# (vectorizer) itself is loaded by feature_store.load_model
+CLASSIFIER_FILES = {
+    'tfidf': ('lr_model_tfidf.pkl', 'gbc_model_tfidf.pkl'),
+    'word2vec': ('lr_model_word2vec.pkl', 'gbc_model_word2vec.pkl'),
+    'glove': ('lr_model_glove.pkl', 'gbc_model_glove.pkl'),
+    'fasttext': ('lr_model_fasttext.pkl', 'gbc_model_fasttext.pkl'),
+}
+
+FeatureModels = namedtuple('FeatureModels', ['embedding', 'lr', 'gbc', 'load_seconds', 'resident_bytes'])
+
+
+def resident_bytes():
+    """Resident set size of this process"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class ModelRegistry:
+    """Loads the models of a feature type on first use and keeps them within a memory budget
+
+    Sizes are the growth of the process RSS while a feature type loads, so memory-mapped
+    vectors only count for the pages actually read. When the total goes over
+    `memory_budget_mb` the least recently used feature types are dropped, except the
+    `pinned` ones (TF-IDF is small and is what a cold start loads).
+
+    The budget covers only what the registry loads (embedding models and classifiers).
+    The corpus feature matrices and LSH indexes that app.py caches with st.cache_resource
+    are not counted and are never evicted, so the process can use more than
+    `memory_budget_mb`; they are memory-mapped and only the pages queries touch stay resident.
+    """
+
+    def __init__(self, memory_budget_mb=2048, pinned=('tfidf',)):
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.pinned = set(pinned)
+        self._models = OrderedDict()
+        self._lock = threading.RLock()
+        self.evictions = 0
+
+    def get(self, feature_name):
+        with self._lock:
+            if feature_name in self._models:
+                self._models.move_to_end(feature_name)
+                return self._models[feature_name]
+
+            start = time.perf_counter()
+            rss = resident_bytes()
+            embedding = feature_store.load_model(feature_name)
+            lr_file, gbc_file = CLASSIFIER_FILES[feature_name]
+            lr_model, gbc_model = joblib.load(lr_file), joblib.load(gbc_file)
+            models = FeatureModels(embedding, lr_model, gbc_model, time.perf_counter() - start,
+                                   max(resident_bytes() - rss, 0))
+
+            self._models[feature_name] = models
+            self.evict(keep=feature_name)
+            return models
+
+    def embedding(self, feature_name):
+        return self.get(feature_name).embedding
+
+    def evict(self, keep=None):
+        """Drop least recently used, unpinned feature types until the budget is met"""
+        with self._lock:
+            for name in list(self._models):
+                if self.total_bytes() <= self.memory_budget:
+                    break
+                if name != keep and name not in self.pinned:
+                    del self._models[name]
+                    self.evictions += 1
+
+    def total_bytes(self):
+        return sum(models.resident_bytes for models in self._models.values())
+
+    def stats(self):
+        """Load time and resident size of every loaded feature type, least recently used first"""
+        with self._lock:
+            return [{'feature': name, 'load_seconds': round(models.load_seconds, 3),
+                     'resident_mb': round(models.resident_bytes / 2 ** 20, 1)}
+                    for name, models in self._models.items()]
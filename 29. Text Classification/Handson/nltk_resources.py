@@ -0,0 +1,65 @@
+import os
+import time
+import argparse
+
+import nltk
+
+# Local, versioned NLTK data directory. It is filled once by running this file
+# (python nltk_resources.py) at build time, the app itself never downloads anything.
+DATA_VERSION = 'v1'
+NLTK_DATA_DIR = os.environ.get(
+    'NLTK_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data', DATA_VERSION))
+
+# Downloader package id -> resource path looked up by nltk.data.find
+RESOURCES = {
+    'wordnet': 'corpora/wordnet',
+    'omw-1.4': 'corpora/omw-1.4',
+    'stopwords': 'corpora/stopwords',
+    'punkt': 'tokenizers/punkt',
+    'punkt_tab': 'tokenizers/punkt_tab',
+}
+
+# Searched before the default locations so every node uses the same pinned copy
+if NLTK_DATA_DIR not in nltk.data.path:
+    nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+
+def missing(*names):
+    missing_names = []
+    for name in names:
+        try:
+            nltk.data.find(RESOURCES[name])
+        except LookupError:
+            missing_names.append(name)
+    return missing_names
+
+
+def require(*names):
+    """Check that the resources exist on disk, without any network access"""
+    missing_names = missing(*names)
+    if missing_names:
+        raise LookupError('NLTK data {} not found in {}, run `python nltk_resources.py` '
+                          'once to install it'.format(', '.join(missing_names), NLTK_DATA_DIR))
+
+
+def download(names=tuple(RESOURCES)):
+    os.makedirs(NLTK_DATA_DIR, exist_ok=True)
+    for name in names:
+        nltk.download(name, download_dir=NLTK_DATA_DIR, quiet=True, raise_on_error=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Install or verify the NLTK data used by the app')
+    parser.add_argument('--check', action='store_true',
+                        help='Only verify the data directory and time the import of utils')
+    args = parser.parse_args()
+
+    if not args.check:
+        download()
+        print(f'Installed {", ".join(RESOURCES)} into {NLTK_DATA_DIR}')
+
+    require(*RESOURCES)
+    start = time.time()
+    import utils
+    print(f'All NLTK data present, importing utils took {time.time() - start:.3f}s')
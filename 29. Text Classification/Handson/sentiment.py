@@ -0,0 +1,136 @@
+import os
+import time
+import hashlib
+import argparse
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from textblob import TextBlob
+
+# Bulk TextBlob sentiment for the corpus and for incoming posts. Scores are memoized
+# by the hash of the normalized text, so repeated posts and re-runs are not scored twice.
+# python sentiment.py --data preprocessed_data.csv --out preprocessed_data_sentiment.parquet
+TEXT_COLUMN = 'claened_text'
+# Scores a long-lived scorer (the app's) keeps, the least recently used are dropped first
+MEMO_SIZE = 100000
+
+
+def normalize_text(text):
+    # Only changes that cannot change the polarity: unicode form and whitespace
+    return ' '.join(unicodedata.normalize('NFKC', str(text)).split())
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def score_chunk(texts):
+    """(polarity, subjectivity) of every text, runs inside a worker process"""
+    scores = []
+    for text in texts:
+        sentiment = TextBlob(text).sentiment
+        scores.append((sentiment.polarity, sentiment.subjectivity))
+    return scores
+
+
+class SentimentScorer:
+    """Chunked, multi-process TextBlob scoring with a bounded normalized-text-hash memo"""
+
+    def __init__(self, workers=None, chunk_size=512, memo_size=MEMO_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.memo = OrderedDict()
+        self.memo_size = memo_size  # None keeps every score
+        self.hits = 0
+        self.misses = 0
+        self.scored = 0
+        self.seconds = 0.0
+
+    def load_memo(self, path):
+        """Reuse the scores of an earlier output file"""
+        previous = pd.read_parquet(path, columns=['text_hash', 'polarity', 'subjectivity'])
+        self._remember(zip(previous['text_hash'], zip(previous['polarity'], previous['subjectivity'])))
+        return len(self.memo)
+
+    def _remember(self, scores):
+        self.memo.update(scores)
+        if self.memo_size is not None:
+            while len(self.memo) > self.memo_size:
+                self.memo.popitem(last=False)
+
+    def score(self, texts):
+        """DataFrame with text_hash, polarity and subjectivity for every text, in order"""
+        start = time.perf_counter()
+        normalized = [normalize_text(text) for text in texts]
+        hashes = [text_hash(text) for text in normalized]
+
+        found, todo = {}, {}
+        for key, text in zip(hashes, normalized):
+            if key in found or key in todo:
+                continue
+            if key in self.memo:
+                self.memo.move_to_end(key)
+                found[key] = self.memo[key]
+            else:
+                todo[key] = text
+        self.misses += len(todo)
+        self.hits += len(hashes) - len(todo)
+
+        keys, pending = list(todo), list(todo.values())
+        chunks = [pending[i:i + self.chunk_size] for i in range(0, len(pending), self.chunk_size)]
+        if self.workers > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(self.workers) as pool:
+                results = [score for chunk in pool.map(score_chunk, chunks) for score in chunk]
+        else:
+            results = [score for chunk in chunks for score in score_chunk(chunk)]
+        found.update(zip(keys, results))
+        self._remember(zip(keys, results))
+        self.scored += len(results)
+
+        scores = [found[key] for key in hashes]
+        self.seconds += time.perf_counter() - start
+        return pd.DataFrame({'text_hash': hashes,
+                             'polarity': [polarity for polarity, _ in scores],
+                             'subjectivity': [subjectivity for _, subjectivity in scores]})
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {'documents': requests, 'scored': self.scored, 'cache_hits': self.hits,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'docs_per_second': requests / self.seconds if self.seconds else 0.0}
+
+
+def score_file(data_path, out_path, column=TEXT_COLUMN, workers=None, chunk_size=512):
+    """Score a CSV column and write the rows with the sentiment columns to a parquet file"""
+    # The whole previous output is the memo of a re-run, so it is not bounded
+    scorer = SentimentScorer(workers, chunk_size, memo_size=None)
+    if os.path.exists(out_path):
+        scorer.load_memo(out_path)
+
+    data = pd.read_csv(data_path)
+    scores = scorer.score(data[column].fillna('').astype(str).tolist())
+    for name in scores.columns:
+        data[name] = scores[name].values
+
+    tmp_path = out_path + '.tmp'
+    data.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, out_path)
+    return scorer
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk sentiment polarity for the corpus')
+    parser.add_argument('--data', default='preprocessed_data.csv')
+    parser.add_argument('--out', default='preprocessed_data_sentiment.parquet')
+    parser.add_argument('--column', default=TEXT_COLUMN)
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=512, help='Documents per worker task')
+    args = parser.parse_args()
+
+    scorer = score_file(args.data, args.out, args.column, args.workers, args.chunk_size)
+    stats = scorer.stats()
+    print(f"{stats['documents']} documents, {stats['scored']} scored, "
+          f"{stats['cache_hits']} from cache ({stats['hit_rate'] * 100:.1f}%), "
+          f"{stats['docs_per_second']:.0f} docs/s -> {args.out}")
@@ -0,0 +1,111 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import joblib
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from nltk.tokenize import word_tokenize
+from pydantic import BaseModel
+
+import nltk_resources
+from utils import preprocess_batch
+from feature_store import compute_feature
+from model_registry import ModelRegistry, CLASSIFIER_FILES
+
+# Configuration is read from the environment so every uvicorn worker loads the same models
+MEMORY_BUDGET_MB = int(os.environ.get('MODEL_MEMORY_MB', 2048))
+SCORING_THREADS = int(os.environ.get('CLASSIFY_THREADS', 4))
+
+
+class ClassifyRequest(BaseModel):
+    text: str
+    feature_type: str = 'tfidf'
+
+
+class BatchRequest(BaseModel):
+    texts: List[str]
+    feature_type: str = 'tfidf'
+
+
+app = FastAPI()
+registry = None
+tgt_names = None
+executor = None
+
+
+@app.on_event('startup')
+def load_models():
+    # Runs once per worker process, other feature types load on their first request
+    global registry, tgt_names, executor
+    nltk_resources.require('punkt_tab', 'stopwords', 'wordnet')
+    tgt_names = joblib.load('target_names.pkl')
+    registry = ModelRegistry(memory_budget_mb=MEMORY_BUDGET_MB)
+    registry.get('tfidf')
+    executor = ThreadPoolExecutor(SCORING_THREADS)
+
+
+def predictions(model, X):
+    """Label and class probabilities of every row for one classifier"""
+    probabilities = model.predict_proba(X)
+    names = [str(tgt_names[label]) for label in model.classes_]
+    best = probabilities.argmax(axis=1)
+    return [{'label': names[i], 'probability': float(row[i]),
+             'probabilities': dict(zip(names, np.round(row, 6).tolist()))}
+            for i, row in zip(best, probabilities)]
+
+
+async def classify_texts(texts, feature_type):
+    feature_name = feature_type.lower()
+    if feature_name not in CLASSIFIER_FILES:
+        raise HTTPException(status_code=400, detail='feature_type must be one of {}'.format(
+            ', '.join(CLASSIFIER_FILES)))
+
+    timings = {}
+    start = time.perf_counter()
+    cleaned = await run_in_threadpool(preprocess_batch, texts)
+    timings['preprocess_ms'] = (time.perf_counter() - start) * 1000
+
+    # The whole batch is vectorized at once, one sparse product or matrix product per request
+    start = time.perf_counter()
+    models = await run_in_threadpool(registry.get, feature_name)
+    tokenized = [word_tokenize(text) for text in cleaned]
+    X = await run_in_threadpool(compute_feature, feature_name, cleaned, tokenized, models.embedding)
+    timings['vectorize_ms'] = (time.perf_counter() - start) * 1000
+
+    # LR and GBC score the batch side by side
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    lr, gbc = await asyncio.gather(loop.run_in_executor(executor, predictions, models.lr, X),
+                                   loop.run_in_executor(executor, predictions, models.gbc, X))
+    timings['score_ms'] = (time.perf_counter() - start) * 1000
+
+    results = [{'text': text, 'lr': lr_row, 'gbc': gbc_row} for text, lr_row, gbc_row in zip(texts, lr, gbc)]
+    return results, timings
+
+
+@app.get('/health')
+def health():
+    return {'status': 'ok', 'models': registry.stats() if registry else []}
+
+
+@app.post('/classify')
+async def classify(request: ClassifyRequest):
+    start = time.perf_counter()
+    results, timings = await classify_texts([request.text], request.feature_type)
+    return dict(results[0], feature_type=request.feature_type, timings=timings,
+                seconds=time.perf_counter() - start)
+
+
+@app.post('/classify/batch')
+async def classify_batch(request: BatchRequest):
+    start = time.perf_counter()
+    results, timings = await classify_texts(request.texts, request.feature_type) if request.texts else ([], {})
+    return {'feature_type': request.feature_type, 'results': results, 'timings': timings,
+            'seconds': time.perf_counter() - start}
+
+# Run the server
+# uvicorn server:app --host 0.0.0.0 --port 8000 --workers 1
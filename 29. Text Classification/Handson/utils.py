@@ -1,35 +1,51 @@
 # utility functions for text preprocessing
 
 import nltk
+import nltk_resources  # use the local NLTK data directory
 from nltk.tokenize import word_tokenize
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 
+import time
 import string
+from functools import lru_cache
+from itertools import repeat
+
 import numpy as np
+from scipy import sparse
+
+@lru_cache(maxsize=None)
+def _resources():
+    # stopword set, lemmatizer and punctuation table are built once, not once per document
+    return set(stopwords.words('english')), WordNetLemmatizer(), str.maketrans('', '', string.punctuation)
 
 # create a function to lowercase, remove punctuations,tokenize , remove stopwords and lemmatization
 def preprocess_text(text):
+    stop_words, lemmatizer, punctuation = _resources()
 
     # lowercase
     text = text.lower()
 
     # remove punctuations
-    text = text.translate(str.maketrans('','',string.punctuation))
+    text = text.translate(punctuation)
 
     # tokenize
     tokens = word_tokenize(text)
 
     # remove stopwords
-    stop_words = set(stopwords.words('english'))
     tokens = [word for word in tokens if word not in stop_words]
 
     #leammatize
-    lemmatizer = WordNetLemmatizer()
     tokens = [lemmatizer.lemmatize(word) for word in tokens]
 
     return ' '.join(tokens)
 
+def preprocess_batch(texts):
+    """
+    preprocess_text over a list of documents, sharing the NLTK resources."""
+
+    return [preprocess_text(text) for text in texts]
+
 def get_word2vec_embeddings(tokens, model):
     """
     Generate Word2Vec embeddings for a list of tokens."""
@@ -39,7 +55,60 @@ def get_word2vec_embeddings(tokens, model):
 
 def get_glove_embeddings(tokens, model): #add blk for glove
     vectors = [model[word] for word in tokens if word in model]
-    return np.mean(vectors, axis=0) if vectors else np.zeros(100)
+    return np.mean(vectors, axis=0) if vectors else np.zeros(model.vector_size)
 
 def get_fasttext_embeddings(text, model): #add blk for fastext
     return model.get_sentence_vector(text)
+
+def embed_documents(tokenized_texts, model):
+    """
+    Mean word vector of every document in one pass, same result as calling
+    get_word2vec_embeddings / get_glove_embeddings on each document.
+
+    Tokens are mapped to vocabulary ids, the ids form a sparse document x vocabulary
+    count matrix, and all the sums come out of one sparse-dense product with the
+    float32 embedding matrix. Documents without known tokens get a zero vector."""
+
+    wv = model.wv if hasattr(model, 'wv') else model  # Word2Vec model or KeyedVectors (GloVe)
+    lengths = np.fromiter((len(tokens) for tokens in tokenized_texts), dtype=np.int64, count=len(tokenized_texts))
+    all_tokens = [token for tokens in tokenized_texts for token in tokens]
+    ids = np.fromiter(map(wv.key_to_index.get, all_tokens, repeat(-1)), dtype=np.int64, count=len(all_tokens))
+
+    rows = np.repeat(np.arange(len(tokenized_texts)), lengths)
+    known = ids >= 0
+    counts = sparse.csr_matrix((np.ones(known.sum(), dtype=np.float32), (rows[known], ids[known])),
+                               shape=(len(tokenized_texts), len(wv.index_to_key)))
+
+    sums = counts @ np.asarray(wv.vectors, dtype=np.float32)
+    n_known = np.asarray(counts.sum(axis=1)).ravel()
+    return sums / np.maximum(n_known, 1)[:, None]
+
+
+if __name__ == '__main__':
+    # Speed of the batched engine against the per-document functions on the full corpus
+    # python utils.py [word2vec|glove]
+    import sys
+    import pandas as pd
+
+    data = pd.read_csv('preprocessed_data.csv')
+    tokenized_texts = [word_tokenize(text) for text in data['claened_text'].fillna('').astype(str)]
+
+    for name in sys.argv[1:] or ['word2vec', 'glove']:
+        if name == 'word2vec':
+            from gensim.models import Word2Vec
+            model, embed_one = Word2Vec.load('word2vec.model'), get_word2vec_embeddings
+        else:
+            import glove_vectors
+            model, embed_one = glove_vectors.load(), get_glove_embeddings
+
+        start = time.perf_counter()
+        expected = np.array([embed_one(tokens, model) for tokens in tokenized_texts])
+        loop_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched = embed_documents(tokenized_texts, model)
+        batch_seconds = time.perf_counter() - start
+
+        print(f'{name:<9} {len(tokenized_texts)} docs: per-document {loop_seconds:.3f}s, '
+              f'batched {batch_seconds:.3f}s ({loop_seconds / batch_seconds:.1f}x), '
+              f'max abs difference {np.abs(expected - batched).max():.2e}')
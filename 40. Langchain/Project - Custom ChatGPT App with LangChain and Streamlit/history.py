@@ -0,0 +1,88 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.schema import SystemMessage, HumanMessage, AIMessage
+
+
+# keeps the prompt sent on each turn within a token budget: system messages, a rolling
+# summary of older turns and the last turns verbatim
+# the summary is computed in a background thread, the turn that triggers it does not wait
+class HistoryManager:
+    def __init__(self, summarize, model='gpt-3.5-turbo', budget_tokens=2000, keep_turns=4, encoding=None):
+        self.summarize = summarize  # summarize(previous_summary, messages) -> new summary text
+        self.budget_tokens = budget_tokens
+        self.keep_turns = keep_turns
+        if encoding is None:
+            import tiktoken
+            encoding = tiktoken.encoding_for_model(model)
+        self.encoding = encoding
+
+        self.summary = ''
+        self.summarized = 0  # number of conversation messages covered by the summary
+        self.last_stats = {}
+        self._future = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    # tokens of a chat prompt, counted the way the OpenAI cookbook does for gpt-3.5/gpt-4:
+    # every message costs 3 tokens of framing and the reply is primed with 3 more
+    def count_tokens(self, messages):
+        return sum(3 + len(self.encoding.encode(message.content)) for message in messages) + 3
+
+    def _summary_message(self):
+        return [SystemMessage(content=f'Summary of the earlier conversation: {self.summary}')] if self.summary else []
+
+    def window(self, messages):
+        system = [m for m in messages if isinstance(m, SystemMessage)]
+        conversation = [m for m in messages if not isinstance(m, SystemMessage)]
+
+        # last keep_turns turns (a turn starts at a user message), fewer if over budget
+        starts = [i for i, m in enumerate(conversation) if isinstance(m, HumanMessage)]
+        start = starts[-self.keep_turns] if len(starts) >= self.keep_turns else 0
+        with self._lock:
+            start = max(start, min(self.summarized, starts[-1] if starts else 0))
+            summary = self._summary_message()
+        while True:
+            prompt = system + summary + conversation[start:]
+            later = [i for i in starts if i > start]
+            if self.count_tokens(prompt) <= self.budget_tokens or not later:
+                break
+            start = later[0]
+
+        # everything before the window goes into the summary, off the critical path
+        # (turns between the summary and the window are left out until their summary lands)
+        self._schedule(conversation[:start])
+
+        self.last_stats = {'prompt_tokens': self.count_tokens(prompt),
+                           'history_tokens': self.count_tokens(system + conversation),
+                           'verbatim_messages': len(conversation) - start,
+                           'summarized_messages': self.summarized,
+                           'summary_tokens': self.count_tokens(summary) if summary else 0}
+        return prompt
+
+    def _schedule(self, older):
+        with self._lock:
+            if len(older) <= self.summarized or (self._future and not self._future.done()):
+                return
+            pending = older[self.summarized:]
+            previous = self.summary
+            covered = len(older)
+
+        def run():
+            summary = self.summarize(previous, pending)
+            with self._lock:
+                self.summary = summary
+                self.summarized = covered
+
+        self._future = self._executor.submit(run)
+
+    def wait(self, timeout=None):
+        """Block until a running summary is done (for tests and benchmarks)"""
+        future = self._future
+        if future:
+            future.result(timeout)
+
+
+def format_messages(messages):
+    roles = {HumanMessage: 'User', AIMessage: 'Assistant'}
+    return '\n'.join(f'{roles.get(type(m), "System")}: {m.content}' for m in messages)
@@ -1,7 +1,10 @@
+import os
 from langchain_openai import ChatOpenAI
 from langchain.schema import SystemMessage, HumanMessage, AIMessage
 import streamlit as st
 from streamlit_chat import message
+from streaming import stream_reply
+from history import HistoryManager, format_messages
 # loading the OpenAI api key from .env (OPENAI_API_KEY="sk-********")
 from dotenv import load_dotenv, find_dotenv
 
@@ -14,7 +17,32 @@ st.set_page_config(
 
 st.subheader('Your Custom ChatGPT 🤖')
 
-chat = ChatOpenAI(model_name='gpt-3.5-turbo', temperature=0.5)
+chat = ChatOpenAI(model_name='gpt-3.5-turbo', temperature=0.5, streaming=True)
+
+# the reply is streamed here, in the main area, while it is generated
+answer_placeholder = st.empty()
+
+# folds turns that no longer fit the prompt into a rolling summary
+summary_chat = ChatOpenAI(model_name='gpt-3.5-turbo', temperature=0)
+
+
+def summarize(previous_summary, messages):
+    prompt = [
+        SystemMessage(content='Condense the conversation into a short summary. Keep the facts, names, '
+                              'numbers and decisions the assistant may need later.'),
+        HumanMessage(content=f'Summary so far: {previous_summary or "(none)"}\n\n'
+                             f'New messages:\n{format_messages(messages)}')
+    ]
+    return summary_chat.invoke(prompt).content
+
+
+# the full history stays in st.session_state.messages for display, only a token-budgeted
+# window of it (last turns verbatim + summary) is sent to the model
+if 'history' not in st.session_state:
+    st.session_state.history = HistoryManager(
+        summarize,
+        budget_tokens=int(os.environ.get('HISTORY_TOKEN_BUDGET', 2000)),
+        keep_turns=int(os.environ.get('HISTORY_KEEP_TURNS', 4)))
 
 # Initialize the messages in the session state
 if 'messages' not in st.session_state:
@@ -38,10 +66,12 @@ with st.sidebar:
             HumanMessage(content=user_prompt)
         )
         with st.spinner('Working on your request ...'):
-            # creating the ChatGPT response
-            response = chat(st.session_state.messages)
+            # creating the ChatGPT response, token by token
+            response, st.session_state.stream_stats = stream_reply(
+                chat, st.session_state.history.window(st.session_state.messages), lambda text: answer_placeholder.markdown(text + '▌'))
+        answer_placeholder.empty()
         # adding the response's content to the session state
-        st.session_state.messages.append(AIMessage(content=response.content))
+        st.session_state.messages.append(AIMessage(content=response))
 
 # Display chat messages
 if len(st.session_state.messages) > 1:
@@ -49,4 +79,17 @@ if len(st.session_state.messages) > 1:
         if isinstance(msg, HumanMessage):
             message(msg.content, is_user=True, key=f'{i} + 🤓')  # user's question
         elif isinstance(msg, AIMessage):
-            message(msg.content, is_user=False, key=f'{i} +  🤖')  # ChatGPT response
\ No newline at end of file
+            message(msg.content, is_user=False, key=f'{i} +  🤖')  # ChatGPT response
+
+# time to first token and tokens/sec of the last reply
+if st.session_state.get('stream_stats', {}).get('ttft_ms') is not None:
+    stats = st.session_state.stream_stats
+    st.caption(f"Last reply: first token after {stats['ttft_ms']:.0f} ms, "
+               f"{stats['tokens']} tokens at {stats['tokens_per_second']:.1f} tokens/s")
+
+# size of the prompt sent on the last turn against the whole conversation
+if st.session_state.history.last_stats:
+    stats = st.session_state.history.last_stats
+    st.caption(f"Prompt: {stats['prompt_tokens']} tokens of {stats['history_tokens']} in the conversation "
+               f"({stats['verbatim_messages']} recent messages verbatim, "
+               f"{stats['summarized_messages']} summarized in {stats['summary_tokens']} tokens)")
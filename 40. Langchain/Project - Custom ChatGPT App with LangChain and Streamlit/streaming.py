@@ -0,0 +1,30 @@
+import time
+
+
+# stream a chat model's reply chunk by chunk (chat.stream), calling on_token with the text
+# received so far, and measure time to first token and tokens/sec
+# works with any LangChain chat model, e.g. ChatOpenAI or the local
+# langchain_core.language_models.fake_chat_models.GenericFakeChatModel in tests
+def stream_reply(chat, messages, on_token=None):
+    start = time.perf_counter()
+    first_token = end = None
+    text = ''
+    tokens = 0
+    for chunk in chat.stream(messages):
+        if not chunk.content:
+            continue
+        end = time.perf_counter()
+        if first_token is None:
+            first_token = end
+        tokens += 1
+        text += chunk.content
+        if on_token:
+            on_token(text)
+
+    stats = {'ttft_ms': None, 'tokens': 0, 'tokens_per_second': 0.0,
+             'total_ms': (time.perf_counter() - start) * 1000}
+    if first_token is not None:
+        streaming_seconds = end - first_token
+        stats.update(ttft_ms=(first_token - start) * 1000, tokens=tokens,
+                     tokens_per_second=(tokens - 1) / streaming_seconds if streaming_seconds > 0 else 0.0)
+    return text, stats
@@ -0,0 +1,76 @@
+import time
+import argparse
+import statistics
+
+from langchain_community.vectorstores import Chroma
+
+from chat_with_documents import load_document, chunk_data, build_chain, get_chain
+from fakes import FakeEmbeddings, FakeChatModel
+
+# Per-question latency of rebuilding the LLM client and chain for every question
+# (the old ask_and_get_answer) against reusing one chain from the session state.
+# Runs offline on the local fakes: the fake LLM pays connect_latency once per instance.
+# A reused chain keeps its memory, so from the second question on it also makes the
+# extra LLM call that condenses the history into a standalone question.
+# python benchmark_chain.py --questions 20 --latency 0.05 --connect-latency 0.1
+
+QUESTIONS = ['What is the main topic?', 'Who is speaking?', 'What is said about the enemy?',
+             'How does it end?', 'What is asked of the listeners?']
+
+
+def time_questions(ask, questions):
+    latencies = []
+    for q in questions:
+        start = time.perf_counter()
+        ask(q)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def make_llm(args):
+    return FakeChatModel(latency=args.latency, connect_latency=args.connect_latency)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Latency of rebuilt versus reused retrieval chains')
+    parser.add_argument('--file', default='files/churchill_speech.txt')
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('-k', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.05, help='Fake LLM seconds per call')
+    parser.add_argument('--connect-latency', type=float, default=0.1,
+                        help='Fake LLM seconds for the first call of a new client')
+    args = parser.parse_args()
+
+    chunks = chunk_data(load_document(args.file), chunk_size=512)
+    vector_store = Chroma.from_documents(chunks, FakeEmbeddings())
+    questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(args.questions)]
+
+    llm_calls = []
+
+    def rebuilt(q):
+        llm = make_llm(args)
+        llm_calls.append(llm)
+        return build_chain(vector_store, args.k, llm, verbose=False).invoke({'question': q})
+
+    session = {}
+    llm = make_llm(args)
+
+    def reused(q):
+        return get_chain(vector_store, args.k, session=session, llm=llm, verbose=False).invoke({'question': q})
+
+    for name, ask in [('rebuilt per question', rebuilt), ('reused from session', reused)]:
+        latencies = time_questions(ask, questions)
+        calls = sum(model.calls for model in llm_calls) if name.startswith('rebuilt') else llm.calls
+        print(f'{name:<22} mean {statistics.mean(latencies):7.1f} ms   '
+              f'p50 {statistics.median(latencies):7.1f} ms   max {max(latencies):7.1f} ms   '
+              f'{calls / len(questions):.1f} LLM calls per question')
+
+    try:
+        from langchain_openai import ChatOpenAI
+        ChatOpenAI(model='gpt-3.5-turbo', api_key='sk-benchmark')  # imports and first client setup
+        start = time.perf_counter()
+        for _ in range(5):
+            ChatOpenAI(model='gpt-3.5-turbo', api_key='sk-benchmark')
+        print(f'each new ChatOpenAI() adds {(time.perf_counter() - start) / 5 * 1000:.1f} ms before its first request')
+    except ImportError:
+        pass
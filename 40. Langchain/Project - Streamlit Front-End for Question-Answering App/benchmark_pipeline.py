@@ -0,0 +1,185 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import statistics
+import tempfile
+from importlib import metadata
+
+from langchain_community.vectorstores import Chroma
+
+from chat_with_documents import EMBEDDING_MODEL, build_chain, ask_and_get_answer
+from embedding_cache import CachedEmbeddings
+from ingestion import IngestionPipeline
+from fakes import FakeEmbeddings, FakeChatModel
+
+# Time of every stage of the app's pipeline, offline. Ingestion runs through
+# IngestionPipeline behind CachedEmbeddings, as ingest_files does, and its stage times
+# (load, split, embed, index) come from pipeline.stats(). The tiktoken cost estimate is
+# made inside the embedding step (cost_estimate is part of embed). Then come retrieve,
+# generate and the whole ask_and_get_answer chain, for a sweep of document sizes, chunk
+# sizes and k. Embeddings and the LLM are the deterministic local fakes with configurable
+# latency, so the numbers measure the app's own overhead and can be compared between commits.
+# python benchmark_pipeline.py --pages 10 100 1000 --chunk-sizes 256 512 1024 -k 3 5 --out pipeline.json
+
+QUESTIONS = ['What does the manual say about pressure valves?', 'How is the pump maintained?',
+             'Which safety checks are required?']
+WORDS = ('pump valve pressure safety check manual operator flow pipe seal motor filter inspect '
+         'replace torque clean report hazard system level gauge temperature').split()
+
+
+# synthetic text document of about `pages` pages of 400 words
+def write_document(path, pages, seed=0):
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        for page in range(pages):
+            f.write(f'Page {page + 1}\n')
+            for _ in range(20):
+                f.write(' '.join(rng.choice(WORDS) for _ in range(20)).capitalize() + '.\n')
+            f.write('\n')
+
+
+def median_ms(function, repeats):
+    """(median milliseconds over repeats, result of the last call)"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), result
+
+
+def versions():
+    found = {'python': platform.python_version()}
+    for package in ['langchain', 'langchain-core', 'langchain-community', 'chromadb', 'tiktoken', 'numpy']:
+        try:
+            found[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            found[package] = None
+    return found
+
+
+# without its encoding files (e.g. offline) tiktoken cannot count, the run goes on without a cost
+class UncountedEmbeddings(CachedEmbeddings):
+    def _count_tokens(self, texts):
+        return 0
+
+
+def tiktoken_available():
+    try:
+        import tiktoken
+        tiktoken.encoding_for_model(EMBEDDING_MODEL)
+        return True
+    except Exception as e:
+        print(f'cost estimate skipped: {e!r}', file=sys.stderr)
+        return False
+
+
+def run(args):
+    workdir = tempfile.mkdtemp()
+    results = []
+    try:
+        results = sweep(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'versions': versions(),
+            'settings': vars(args), 'results': results}
+
+
+# one ingestion of the file into a fresh collection and a fresh embedding cache, like a first upload
+def ingest(path, chunk_size, args, workdir, counted):
+    run_id = time.perf_counter_ns()
+    embeddings = (CachedEmbeddings if counted else UncountedEmbeddings)(
+        FakeEmbeddings(args.dim, latency=args.embed_latency), EMBEDDING_MODEL, args.dim,
+        path=os.path.join(workdir, f'cache_{run_id}.sqlite'))
+    vector_store = Chroma(embedding_function=embeddings, collection_name=f'bench_{run_id}')
+    pipeline = IngestionPipeline(embeddings, vector_store, chunk_size, args.chunk_overlap,
+                                 batch_size=args.batch_size, workers=args.workers)
+    stats = pipeline.run([path])
+    cache = embeddings.stats()
+    stats['count_seconds'] = cache['count_seconds'] if counted else None
+    stats['tokens'] = cache['embedded_tokens'] if counted else None
+    stats['embedding_cost_usd'] = cache['embedded_usd'] if counted else None
+    return vector_store, stats
+
+
+def median_stat_ms(runs, name):
+    values = [stats[name] for stats in runs]
+    return None if None in values else statistics.median(values) * 1000
+
+
+def sweep(args, workdir):
+    results = []
+    counted = tiktoken_available()
+    for pages in args.pages:
+        path = os.path.join(workdir, f'document_{pages}.txt')
+        write_document(path, pages)
+
+        for chunk_size in args.chunk_sizes:
+            runs, stores = [], []
+            for _ in range(args.repeats):
+                vector_store, stats = ingest(path, chunk_size, args, workdir, counted)
+                stores.append(vector_store)
+                runs.append(stats)
+            stats = runs[-1]
+            # embed is summed over the worker threads, ingest is the wall time of the whole run
+            stages = {stage: median_stat_ms(runs, name) for stage, name in [
+                ('load', 'load_seconds'), ('split', 'split_seconds'), ('cost_estimate', 'count_seconds'),
+                ('embed', 'embed_seconds'), ('index', 'index_seconds'), ('ingest', 'seconds')]}
+
+            for k in args.k:
+                retriever = vector_store.as_retriever(search_type='similarity', search_kwargs={'k': k})
+                llm = FakeChatModel(latency=args.llm_latency, token_latency=args.token_latency)
+                retrieve, generate, answer = [], [], []
+                for question in QUESTIONS:
+                    ms, documents = median_ms(lambda: retriever.invoke(question), args.repeats)
+                    retrieve.append(ms)
+                    context = '\n\n'.join(document.page_content for document in documents)
+                    prompt = f'Use the following pieces of context to answer the question.\n\n{context}\n\nQuestion: {question}'
+                    generate.append(median_ms(lambda: llm.invoke(prompt), args.repeats)[0])
+                    # the app's chain, one per question as in a new session (no condensing call)
+                    answer.append(median_ms(lambda: ask_and_get_answer(
+                        vector_store, question, k, chain=build_chain(vector_store, k, llm, verbose=False)),
+                        args.repeats)[0])
+
+                results.append({
+                    'pages': pages, 'characters': os.path.getsize(path),
+                    'chunk_size': chunk_size, 'k': k, 'chunks': stats['chunks'],
+                    'duplicates': stats['duplicates'], 'embedded': stats['embedded'],
+                    'tokens': stats['tokens'], 'embedding_cost_usd': stats['embedding_cost_usd'],
+                    'stages_ms': dict(stages, retrieve=statistics.median(retrieve),
+                                      generate=statistics.median(generate), answer=statistics.median(answer)),
+                })
+                row = results[-1]
+                print(f"pages {pages:>5}  chunk_size {chunk_size:>5}  k {k:>2}  chunks {row['chunks']:>6}  " +
+                      '  '.join(f'{name} {ms:.1f}' if ms is not None else f'{name} -'
+                                for name, ms in row['stages_ms'].items()))
+            for store in stores:
+                store.delete_collection()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline per-stage timings of the question-answering pipeline')
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[256, 512, 1024])
+    parser.add_argument('-k', type=int, nargs='+', default=[3, 5])
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per measurement, the median is reported')
+    parser.add_argument('--chunk-overlap', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=64, help='Chunks per embedding request')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent embedding requests')
+    parser.add_argument('--dim', type=int, default=1536, help='Fake embedding dimensions')
+    parser.add_argument('--embed-latency', type=float, default=0.0, help='Fake seconds per embedding call')
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='Fake seconds before the LLM answers')
+    parser.add_argument('--token-latency', type=float, default=0.0, help='Fake seconds between streamed tokens')
+    parser.add_argument('--out', default='benchmark_pipeline.json')
+    args = parser.parse_args()
+
+    report = run(args)
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"{len(report['results'])} results -> {args.out}")
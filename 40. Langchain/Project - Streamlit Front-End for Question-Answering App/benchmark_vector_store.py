@@ -0,0 +1,104 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+from langchain_community.vectorstores import Chroma
+
+from fakes import FakeEmbeddings
+from quantized_store import QuantizedVectorStore
+
+# Memory per million chunks and recall@k of QuantizedVectorStore (with and without the
+# float32 rescoring pass) and of Chroma, against exact float32 search.
+# The vectors are synthetic but clustered like real embeddings: topics plus noise.
+# python benchmark_vector_store.py --vectors 20000 --queries 200 -k 5
+
+
+def clustered_vectors(n, dim, topics, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    vectors = centers[rng.integers(topics, size=n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def timed(search, queries):
+    start = time.perf_counter()
+    results = [search(query) for query in queries]
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Quantized vector store versus Chroma')
+    parser.add_argument('--vectors', type=int, default=20000)
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--topics', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('-k', type=int, default=5)
+    parser.add_argument('--rescore-factor', type=int, default=10)
+    args = parser.parse_args()
+
+    data = clustered_vectors(args.vectors + args.queries, args.dim, args.topics)
+    vectors, queries = data[:args.vectors], data[args.vectors:]
+    ids = [str(i) for i in range(args.vectors)]
+    texts = [f'chunk {i}' for i in ids]
+    truth = [np.argsort(-(vectors @ query))[:args.k].astype(str).tolist() for query in queries]
+
+    workdir = tempfile.mkdtemp()
+    try:
+        quantized = QuantizedVectorStore(os.path.join(workdir, 'quantized'), FakeEmbeddings(args.dim),
+                                         rescore_factor=args.rescore_factor)
+        start = time.perf_counter()
+        for i in range(0, args.vectors, 5000):
+            quantized.add_embeddings(zip(texts[i:i + 5000], vectors[i:i + 5000]), ids=ids[i:i + 5000])
+        print(f'quantized store: {args.vectors} vectors added in {time.perf_counter() - start:.1f} s')
+
+        chroma = Chroma(persist_directory=os.path.join(workdir, 'chroma'), embedding_function=FakeEmbeddings(args.dim))
+        start = time.perf_counter()
+        for i in range(0, args.vectors, 5000):
+            chroma._collection.add(ids=ids[i:i + 5000], embeddings=vectors[i:i + 5000], documents=texts[i:i + 5000])
+        print(f'chroma:          {args.vectors} vectors added in {time.perf_counter() - start:.1f} s')
+
+        def int8_only(query):
+            quantized.rescore_factor = 1
+            try:
+                return quantized.search_rows(query, args.k)[0].astype(str).tolist()
+            finally:
+                quantized.rescore_factor = args.rescore_factor
+
+        searches = {
+            'exact float32': lambda query: np.argsort(-(vectors @ query))[:args.k].astype(str).tolist(),
+            'int8 only': int8_only,
+            f'int8 + rescore x{args.rescore_factor}':
+                lambda query: quantized.search_rows(query, args.k)[0].astype(str).tolist(),
+            'chroma (hnsw)': lambda query: chroma._collection.query(query_embeddings=[query], n_results=args.k,
+                                                                     include=[])['ids'][0],
+        }
+        results, latency = {}, {}
+        for name, search in searches.items():
+            results[name], latency[name] = timed(search, queries)
+        print(f'\n{"search":<22} {"recall@" + str(args.k):>9} {"vs chroma":>10} {"ms/query":>9}')
+        for name in searches:
+            print(f'{name:<22} {recall(results[name], truth):9.3f} '
+                  f'{recall(results[name], results["chroma (hnsw)"]):10.3f} {latency[name]:9.2f}')
+
+        stats = quantized.stats()
+        per_million = 1e6 / args.vectors / 2 ** 30
+        print(f'\nper million {args.dim}-d chunks:')
+        print(f'  int8 vectors + scales (scanned, resident)  {stats["scan_bytes"] * per_million:6.2f} GB')
+        print(f'  float32 vectors (Chroma keeps these in RAM) {stats["float32_bytes"] * per_million:6.2f} GB')
+        print(f'  quantized store on disk                    '
+              f'{directory_bytes(os.path.join(workdir, "quantized")) * per_million:6.2f} GB')
+        print(f'  chroma on disk                             '
+              f'{directory_bytes(os.path.join(workdir, "chroma")) * per_million:6.2f} GB')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -1,9 +1,27 @@
 # Install all libraries by running in the terminal: pip install -q -r ./requirements.txt
+import os
+import time
+import shutil
+from functools import lru_cache
+
 import streamlit as st
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationalRetrievalChain
+from langchain_core.callbacks import BaseCallbackHandler
+
+from embedding_cache import CachedEmbeddings
+from ingestion import IngestionPipeline, file_set_hash
+from quantized_store import QuantizedVectorStore
+from semantic_cache import SemanticCache
+
+EMBEDDING_MODEL = 'text-embedding-3-small'
+EMBEDDING_DIMENSIONS = 1536  # 512 works as well
+# 'chroma' or 'quantized' (int8 vectors in a memory-mapped file, about a quarter of Chroma's RAM)
+VECTOR_STORE = os.environ.get('VECTOR_STORE', 'chroma')
+LLM_MODEL = 'gpt-3.5-turbo'
+LLM_TEMPERATURE = 1
 
 
 # loading PDF, DOCX and TXT files as LangChain Documents
@@ -38,37 +56,149 @@ def chunk_data(data, chunk_size=256, chunk_overlap=20):
     return chunks
 
 
-# create embeddings using OpenAIEmbeddings() and save them in a Chroma vector store
-def create_embeddings(chunks):
-    embeddings = OpenAIEmbeddings(model='text-embedding-3-small', dimensions=1536)  # 512 works as well
-    vector_store = Chroma.from_documents(chunks, embeddings)
+# OpenAIEmbeddings() behind a persistent on-disk cache, one per process
+@lru_cache(maxsize=None)
+def cached_embeddings():
+    embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS)
+    return CachedEmbeddings(embeddings, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
 
-    # if you want to use a specific directory for chromadb
-    # vector_store = Chroma.from_documents(chunks, embeddings, persist_directory='./mychroma_db')
-    return vector_store
 
+def open_vector_store(name, persist_root=None):
+    if VECTOR_STORE == 'quantized':
+        return QuantizedVectorStore(os.path.join(persist_root or './quantized_db', name), cached_embeddings())
+    return Chroma(persist_directory=os.path.join(persist_root or './chroma_db', name),
+                  embedding_function=cached_embeddings())
 
-def ask_and_get_answer(vector_store, q, k=3):
-    from langchain.chains import RetrievalQA
+
+# streams any number of files into a persistent Chroma collection keyed by the files' contents
+# and chunking settings, in concurrent embedding batches written as they complete
+# chunks already in the collection are skipped, so an interrupted ingestion resumes
+def ingest_files(files, chunk_size=256, chunk_overlap=20, persist_root=None, on_progress=None):
+    document_set = file_set_hash(files, chunk_size, chunk_overlap, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS)
+    vector_store = open_vector_store(document_set[:16], persist_root)
+    pipeline = IngestionPipeline(cached_embeddings(), vector_store, chunk_size, chunk_overlap,
+                                 workers=int(os.environ.get('INGEST_WORKERS', 4)),
+                                 requests_per_minute=int(os.environ.get('EMBEDDING_RPM', 0)) or None)
+    pipeline.run(files, on_progress)
+    return vector_store, document_set, pipeline.stats()
+
+
+# one ChatOpenAI per model settings and API key, shared by all sessions so its HTTP
+# connection pool to the API is reused (older langchain_openai versions open a new
+# pool per instance, which meant a new TLS handshake for every question)
+@lru_cache(maxsize=8)
+def get_llm(model=LLM_MODEL, temperature=LLM_TEMPERATURE, api_key=None):
     from langchain_openai import ChatOpenAI
+    # the key is passed on, so the cache key and the client's credentials always agree
+    return ChatOpenAI(model=model, temperature=temperature, streaming=True, api_key=api_key)
+
+
+def build_chain(vector_store, k=3, llm=None, verbose=True):
+    from langchain.chains import RetrievalQA
 
-    llm = ChatOpenAI(model='gpt-3.5-turbo', temperature=1)
+    llm = llm or get_llm(LLM_MODEL, LLM_TEMPERATURE, os.environ.get('OPENAI_API_KEY'))
     retriever = vector_store.as_retriever(search_type='similarity', search_kwargs={'k': k})
     # Create a memory buffer to track the conversation
-    memory = ConversationBufferMemory(memory_key='chat_history', return_messages=True)
+    memory = ConversationBufferMemory(memory_key='chat_history', return_messages=True, output_key='answer')
 
     #chain = RetrievalQA.from_chain_type(llm=llm, chain_type="stuff", retriever=retriever)
     chain = ConversationalRetrievalChain.from_llm(
-    llm=llm,  # Link the ChatGPT LLM
+    llm=llm.with_config(tags=['answer']),  # Link the ChatGPT LLM, tagged so only the answer is streamed
+    condense_question_llm=llm,  # rewrites follow-up questions using the chat history
     retriever=retriever,  # Link the vector store based retriever
     memory=memory,  # Link the conversation memory
     chain_type='stuff',  # Specify the chain type
-    verbose=True  # Set to True to enable verbose logging for debugging
+    return_source_documents=True,  # keep the retrieved chunks, they are cached along with the answer
+    verbose=verbose  # Set to True to enable verbose logging for debugging
     )
-    answer = chain.invoke({'question': q})
+    return chain
+
+
+# the chain (and with it the conversation memory) lives in the session state and is only
+# rebuilt when the vector store, k or the model settings change
+def get_chain(vector_store, k=3, session=None, llm=None, verbose=True):
+    session = st.session_state if session is None else session
+    key = (id(vector_store), k, LLM_MODEL, LLM_TEMPERATURE, os.environ.get('OPENAI_API_KEY'))
+    if session.get('chain_key') != key:
+        session['chain'] = build_chain(vector_store, k, llm, verbose)
+        session['chain_key'] = key
+    return session['chain']
+
+
+# streams the tokens of the answer into a Streamlit placeholder as they arrive and measures
+# time to first token and tokens/sec (the question-condensing call is not shown)
+class StreamHandler(BaseCallbackHandler):
+    def __init__(self, container=None, tag='answer'):
+        self.container = container
+        self.tag = tag
+        self.text = ''
+        self.tokens = 0
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.end = None
+        self._runs = set()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, **kwargs):
+        if tags and self.tag in tags:
+            self._runs.add(run_id)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if run_id not in self._runs:
+            return
+        self.end = time.perf_counter()
+        if self.first_token is None:
+            self.first_token = self.end
+        self.tokens += 1
+        self.text += token
+        if self.container is not None:
+            self.container.markdown(self.text + '▌')
+
+    def stats(self):
+        if self.first_token is None:
+            return {'ttft_ms': None, 'tokens': 0, 'tokens_per_second': 0.0}
+        streaming_seconds = self.end - self.first_token
+        return {'ttft_ms': (self.first_token - self.start) * 1000, 'tokens': self.tokens,
+                'tokens_per_second': (self.tokens - 1) / streaming_seconds if streaming_seconds > 0 else 0.0}
+
+
+def ask_and_get_answer(vector_store, q, k=3, chain=None, handler=None):
+    chain = chain or get_chain(vector_store, k)
+    config = {'callbacks': [handler]} if handler else None
+    answer = chain.invoke({'question': q}, config=config)
     return answer
 
 
+# answers shared by all sessions, a near-duplicate question about the same document set
+# skips retrieval and the LLM
+@lru_cache(maxsize=None)
+def semantic_cache():
+    return SemanticCache(cached_embeddings(),
+                         threshold=float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', 0.95)),
+                         ttl_seconds=int(os.environ.get('SEMANTIC_CACHE_TTL', 3600)),
+                         max_entries=int(os.environ.get('SEMANTIC_CACHE_SIZE', 512)))
+
+
+# returns the answer and the cache entry it came from (None if the chain had to run)
+# the cache is shared by all sessions and keyed on the raw question, so only the first question
+# of a conversation uses it: a follow-up like "what about the second one?" is rewritten with
+# this session's history and must not get an answer cached from another conversation
+def ask_with_cache(vector_store, document_set, q, k=3, cache=None, chain=None, **kwargs):
+    cache = cache or semantic_cache()
+    chain = chain or get_chain(vector_store, k)
+    if chain.memory.chat_memory.messages:
+        return ask_and_get_answer(vector_store, q, k, chain=chain, **kwargs), None
+
+    hit = cache.lookup((document_set, k), q)
+    if hit:
+        # kept in the conversation memory, so the next question is condensed against it
+        chain.memory.save_context({'question': q}, {'answer': hit['answer']})
+        return {'question': q, 'answer': hit['answer'], 'source_documents': hit['sources']}, hit
+
+    answer = ask_and_get_answer(vector_store, q, k, chain=chain, **kwargs)
+    cache.store((document_set, k), q, answer['answer'], answer.get('source_documents', []))
+    return answer, None
+
+
 # calculate embedding cost using tiktoken
 def calculate_embedding_cost(texts):
     import tiktoken
@@ -87,8 +217,6 @@ def clear_history():
 
 
 if __name__ == "__main__":
-    import os
-
     # loading the OpenAI api key from .env
     from dotenv import load_dotenv, find_dotenv
     load_dotenv(find_dotenv(), override=True)
@@ -102,7 +230,7 @@ if __name__ == "__main__":
             os.environ['OPENAI_API_KEY'] = api_key
 
         # file uploader widget
-        uploaded_file = st.file_uploader('Upload a file:', type=['pdf', 'docx', 'txt'])
+        uploaded_files = st.file_uploader('Upload files:', type=['pdf', 'docx', 'txt'], accept_multiple_files=True)
 
         # chunk size number widget
         chunk_size = st.number_input('Chunk size:', min_value=100, max_value=2048, value=512, on_change=clear_history)
@@ -113,28 +241,45 @@ if __name__ == "__main__":
         # add data button widget
         add_data = st.button('Add Data', on_click=clear_history)
 
-        if uploaded_file and add_data: # if the user browsed a file
-            with st.spinner('Reading, chunking and embedding file ...'):
-
-                # writing the file from RAM to the current directory on disk
-                bytes_data = uploaded_file.read()
-                file_name = os.path.join('./', uploaded_file.name)
-                with open(file_name, 'wb') as f:
-                    f.write(bytes_data)
-
-                data = load_document(file_name)
-                chunks = chunk_data(data, chunk_size=chunk_size)
-                st.write(f'Chunk size: {chunk_size}, Chunks: {len(chunks)}')
-
-                tokens, embedding_cost = calculate_embedding_cost(chunks)
-                st.write(f'Embedding cost: ${embedding_cost:.4f}')
-
-                # creating the embeddings and returning the Chroma vector store
-                vector_store = create_embeddings(chunks)
+        if uploaded_files and add_data: # if the user browsed files
+            with st.spinner('Reading, chunking and embedding files ...'):
+                # writing the files to the current directory on disk, in pieces
+                file_names = []
+                for uploaded_file in uploaded_files:
+                    file_name = os.path.join('./', uploaded_file.name)
+                    with open(file_name, 'wb') as f:
+                        shutil.copyfileobj(uploaded_file, f)
+                    file_names.append(file_name)
+
+                # pages are chunked and embedded while the files are still being read
+                progress = st.empty()
+                def show_progress(stats):
+                    progress.write(f"{stats['pages']} pages, {stats['chunks']} chunks "
+                                   f"({stats['duplicates']} duplicates), {stats['embedded']} embedded "
+                                   f"at {stats['chunks_per_second']:.0f} chunks/s")
+
+                before = cached_embeddings().stats()
+                vector_store, document_set, stats = ingest_files(file_names, chunk_size, on_progress=show_progress)
+                after = cached_embeddings().stats()
+                show_progress(stats)
+                st.write(f"Chunk size: {chunk_size}, Chunks: {stats['chunks']}, "
+                         f"{stats['already_stored']} already in the vector store")
+                # only the chunks that missed the embedding cache were sent to the API
+                st.write(f'Embedding cost: {after["embedded_tokens"] - before["embedded_tokens"]} tokens, '
+                         f'${after["embedded_usd"] - before["embedded_usd"]:.4f}')
+
+                hits, misses = after['hits'] - before['hits'], after['misses'] - before['misses']
+                if hits + misses:
+                    st.write(f'Embedding cache: {hits / (hits + misses):.0%} of {hits + misses} chunks cached, '
+                             f'{after["saved_tokens"] - before["saved_tokens"]} tokens '
+                             f'(${after["saved_usd"] - before["saved_usd"]:.4f}) saved')
+                else:
+                    st.write('Embedding cache: vector store reused, nothing embedded')
 
                 # saving the vector store in the streamlit session state (to be persistent between reruns)
                 st.session_state.vs = vector_store
-                st.success('File uploaded, chunked and embedded successfully.')
+                st.session_state.vs_hash = document_set
+                st.success(f'{len(file_names)} file(s) uploaded, chunked and embedded successfully.')
 
     # user's question text input widget
     q = st.text_input('Ask a question about the content of your file:')
@@ -142,10 +287,27 @@ if __name__ == "__main__":
         if 'vs' in st.session_state: # if there's the vector store (user uploaded, split and embedded a file)
             vector_store = st.session_state.vs
             st.write(f'k: {k}')
-            answer = ask_and_get_answer(vector_store, q, k)
+
+            # the answer is rendered token by token while it is generated
+            handler = StreamHandler(st.empty())
+            answer, cached = ask_with_cache(vector_store, st.session_state.get('vs_hash'), q, k, handler=handler)
+            handler.container.empty()
 
             # text area widget for the LLM answer
-            st.text_area('LLM Answer: ', value=answer)
+            st.text_area('LLM Answer: ', value=answer['answer'])
+            with st.expander('Sources'):
+                for document in answer.get('source_documents', []):
+                    st.caption(f"{document.metadata.get('source', '')} {document.metadata.get('page', '')}")
+                    st.write(document.page_content)
+
+            stats = handler.stats()
+            cache_stats = semantic_cache().stats()
+            if cached:
+                st.caption(f"Answered from the semantic cache (similarity {cached['similarity']:.3f} to "
+                           f"\"{cached['question']}\"), hit rate {cache_stats['hit_rate']:.0%}")
+            elif stats['ttft_ms'] is not None:
+                st.caption(f"Time to first token: {stats['ttft_ms']:.0f} ms, "
+                           f"{stats['tokens']} tokens at {stats['tokens_per_second']:.1f} tokens/s")
 
             st.divider()
 
@@ -155,7 +317,7 @@ if __name__ == "__main__":
 
             # the current question and answer
             # the current question and answer
-            value = f'Q: {q} \nA: {answer}'
+            value = f'Q: {q} \nA: {answer["answer"]}'
 
             st.session_state.history = f'{value} \n {"-" * 100} \n {st.session_state.history}'
             h = st.session_state.history
@@ -0,0 +1,97 @@
+import time
+import hashlib
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+# embeddings stored on disk by content address: sha256(model|dimensions|text)
+# re-uploading a file or changing only chunk_size never re-embeds a chunk it has seen before
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings, model, dimensions, path='embedding_cache.sqlite',
+                 price_per_1k_tokens=0.00002):
+        self.embeddings = embeddings
+        self.model = model
+        self.dimensions = dimensions
+        self.price_per_1k_tokens = price_per_1k_tokens
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)')
+        self._db.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+        self.embedded_tokens = 0  # tokens of the cache misses, sent to the embeddings API
+        self.count_seconds = 0.0  # spent counting tokens with tiktoken
+        self._encoding = None
+
+    def key(self, text):
+        return hashlib.sha256(f'{self.model}|{self.dimensions}|{text}'.encode('utf-8')).hexdigest()
+
+    def _count_tokens(self, texts):
+        import tiktoken
+        start = time.perf_counter()
+        if self._encoding is None:
+            self._encoding = tiktoken.encoding_for_model(self.model)
+        tokens = sum(len(self._encoding.encode(text)) for text in texts)
+        with self._lock:
+            self.count_seconds += time.perf_counter() - start
+        return tokens
+
+    def _lookup(self, keys):
+        found = {}
+        # sqlite limits the number of bound parameters, so look the keys up in slices
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            rows = self._db.execute('SELECT key, vector FROM embeddings WHERE key IN ({})'.format(
+                ','.join('?' * len(part))), part)
+            found.update((key, np.frombuffer(vector, dtype=np.float32)) for key, vector in rows)
+        return found
+
+    def embed_documents(self, texts):
+        keys = [self.key(text) for text in texts]
+        with self._lock:
+            cached = self._lookup(list(set(keys)))
+
+        # each distinct missing text is embedded once, even if it occurs several times in the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        hit_texts = [text for key, text in zip(keys, texts) if key in cached]
+        # counted outside the lock, the worker threads of the ingestion pipeline embed concurrently
+        saved_tokens = self._count_tokens(hit_texts) if hit_texts else 0
+        embedded_tokens = self._count_tokens(list(missing.values())) if missing else 0
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            new = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+            with self._lock:
+                self._db.executemany('INSERT OR REPLACE INTO embeddings VALUES (?, ?)',
+                                     [(key, vector.tobytes()) for key, vector in new.items()])
+                self._db.commit()
+            cached.update(new)
+
+        with self._lock:
+            self.hits += len(hit_texts)
+            self.misses += len(missing)
+            self.saved_tokens += saved_tokens
+            self.embedded_tokens += embedded_tokens
+        return [cached[key].tolist() for key in keys]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'saved_tokens': self.saved_tokens,
+                'saved_usd': self.saved_tokens / 1000 * self.price_per_1k_tokens,
+                'embedded_tokens': self.embedded_tokens,
+                'embedded_usd': self.embedded_tokens / 1000 * self.price_per_1k_tokens,
+                'count_seconds': self.count_seconds}
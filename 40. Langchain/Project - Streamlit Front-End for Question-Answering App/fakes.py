@@ -0,0 +1,85 @@
+import re
+import time
+import hashlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+# local stand-ins for OpenAIEmbeddings and ChatOpenAI, so the app's chains can be timed
+# and tested without network access or an API key
+
+
+# deterministic hashed bag-of-words vectors: texts sharing words get similar vectors,
+# which keeps similarity search meaningful
+class FakeEmbeddings(Embeddings):
+    def __init__(self, size=1536, latency=0.0):
+        self.size = size
+        self.latency = latency  # seconds per embed_documents call
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in re.findall(r'\w+', text.lower()):
+            index = int.from_bytes(hashlib.md5(word.encode('utf-8')).digest()[:4], 'little')
+            vector[index % self.size] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        self.calls += 1
+        self.texts += len(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+# chat model answering with a fixed template after a configurable delay
+# connect_latency is paid once per instance, like opening a new connection to the API
+# with streaming=True the answer arrives word by word, token_latency apart
+class FakeChatModel(BaseChatModel):
+    latency: float = 0.0
+    connect_latency: float = 0.0
+    token_latency: float = 0.0
+    streaming: bool = False
+    answer: str = 'This is a fake answer about: {question}'
+    calls: int = 0
+    connected: bool = False
+
+    @property
+    def _llm_type(self):
+        return 'fake-chat'
+
+    def _reply(self, messages):
+        if not self.connected:
+            time.sleep(self.connect_latency)
+            self.connected = True
+        self.calls += 1
+        question = messages[-1].content if messages else ''
+        return self.answer.format(question=question.strip().splitlines()[-1] if question.strip() else '')
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        # like ChatOpenAI, a streaming model streams even when called through invoke()
+        if self.streaming:
+            text = ''.join(chunk.message.content for chunk in self._stream(messages, stop, run_manager, **kwargs))
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+        text = self._reply(messages)
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        text = self._reply(messages)
+        time.sleep(self.latency)
+        for token in re.findall(r'\S+\s*', text):
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
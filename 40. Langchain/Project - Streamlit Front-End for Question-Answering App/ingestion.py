@@ -0,0 +1,242 @@
+import os
+import time
+import random
+import zipfile
+import hashlib
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from langchain_core.documents import Document
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+# pages of a PDF, DOCX or TXT file as LangChain Documents, one at a time
+# nothing but the current page is kept: PDF pages are extracted as they are read, DOCX and TXT
+# files (which have no pages) are cut into blocks of about block_chars characters
+def iter_pages(file, block_chars=4000):
+    name, extension = os.path.splitext(file)
+    if extension == '.pdf':
+        from langchain_community.document_loaders import PyPDFLoader
+        yield from PyPDFLoader(file).lazy_load()
+    elif extension == '.docx':
+        yield from _blocks(_docx_paragraphs(file), file, block_chars)
+    elif extension == '.txt':
+        with open(file, encoding='utf-8', errors='replace') as f:
+            yield from _blocks(f, file, block_chars)
+    else:
+        raise ValueError(f'Document format {extension} is not supported!')
+
+
+# paragraphs of word/document.xml, parsed incrementally straight from the zip archive
+def _docx_paragraphs(file):
+    with zipfile.ZipFile(file) as archive, archive.open('word/document.xml') as xml:
+        for event, element in ET.iterparse(xml):
+            if element.tag == WORD_NAMESPACE + 'p':
+                yield ''.join(text.text or '' for text in element.iter(WORD_NAMESPACE + 't')) + '\n'
+                element.clear()
+
+
+def _blocks(lines, source, block_chars):
+    block, size, number = [], 0, 0
+    for line in lines:
+        block.append(line)
+        size += len(line)
+        if size >= block_chars:
+            yield Document(page_content=''.join(block), metadata={'source': source, 'page': number})
+            block, size, number = [], 0, number + 1
+    if block:
+        yield Document(page_content=''.join(block), metadata={'source': source, 'page': number})
+
+
+# chunks of each page as soon as the page is read
+def iter_chunks(pages, chunk_size=256, chunk_overlap=20):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    for page in pages:
+        yield from text_splitter.split_documents([page])
+
+
+def chunk_id(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# hash of the files' contents and the chunking settings, known before anything is chunked
+def file_set_hash(files, chunk_size, chunk_overlap, model, dimensions):
+    digest = hashlib.sha256(f'{model}|{dimensions}|{chunk_size}|{chunk_overlap}'.encode('utf-8'))
+    for file in sorted(files):
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+# at most `rate` calls per `per` seconds over all threads
+class RateLimiter:
+    def __init__(self, rate, per=60.0):
+        self.interval = per / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(start - now)
+
+
+# files -> pages -> chunks -> embedding batches -> vector store, as a stream
+# identical chunks (by content hash) are embedded once and chunks the collection already
+# holds are skipped, so an interrupted ingestion resumes where it stopped
+# at most 2 * workers batches are in flight, which bounds memory whatever the file sizes
+class IngestionPipeline:
+    def __init__(self, embeddings, vector_store, chunk_size=256, chunk_overlap=20, batch_size=64,
+                 workers=4, requests_per_minute=None, max_retries=5, backoff_seconds=1.0):
+        self.embeddings = embeddings
+        self.vector_store = vector_store
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.batch_size = batch_size
+        self.workers = workers
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+        self._lock = threading.Lock()
+        self.pages = 0
+        self.chunks = 0
+        self.duplicates = 0
+        self.stored = 0  # already in the vector store
+        self.embedded = 0
+        self.retries = 0
+        self.seconds = 0.0
+        # time per stage, embed_seconds is summed over the worker threads
+        self.load_seconds = 0.0
+        self.read_seconds = 0.0  # loading, splitting and deduplicating
+        self.embed_seconds = 0.0
+        self.index_seconds = 0.0
+
+    def _embed(self, texts):
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+                with self._lock:
+                    self.embed_seconds += time.perf_counter() - start
+                return vectors
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                with self._lock:
+                    self.embed_seconds += time.perf_counter() - start
+                    self.retries += 1
+                # exponential backoff with jitter, so throttled workers do not retry in lockstep
+                time.sleep(self.backoff_seconds * 2 ** attempt * (0.5 + random.random()))
+
+    def _batches(self, files):
+        seen = set()
+        batch = []
+        for file in files:
+            for chunk in iter_chunks(self._pages(file), self.chunk_size, self.chunk_overlap):
+                self.chunks += 1
+                key = chunk_id(chunk.page_content)
+                if key in seen:
+                    self.duplicates += 1
+                    continue
+                seen.add(key)
+                batch.append((key, chunk))
+                if len(batch) == self.batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def _pages(self, file):
+        pages = iter_pages(file)
+        while True:
+            start = time.perf_counter()
+            page = next(pages, None)
+            self.load_seconds += time.perf_counter() - start
+            if page is None:
+                return
+            self.pages += 1
+            yield page
+
+    # stores with add_embeddings (like FAISS and QuantizedVectorStore) go through the LangChain API,
+    # Chroma through its collection, which takes precomputed embeddings
+    def _new(self, batch):
+        ids = [key for key, _ in batch]
+        if hasattr(self.vector_store, 'add_embeddings'):
+            present = {document.id for document in self.vector_store.get_by_ids(ids)}
+        else:
+            present = set(self.vector_store._collection.get(ids=ids, include=[])['ids'])
+        self.stored += len(present)
+        return [(key, chunk) for key, chunk in batch if key not in present]
+
+    def _write(self, batch, vectors):
+        if hasattr(self.vector_store, 'add_embeddings'):
+            self.vector_store.add_embeddings([(chunk.page_content, vector) for (_, chunk), vector in zip(batch, vectors)],
+                                             [chunk.metadata for _, chunk in batch], [key for key, _ in batch])
+            self.embedded += len(batch)
+            return
+        self.vector_store._collection.upsert(
+            ids=[key for key, _ in batch],
+            embeddings=[list(vector) for vector in vectors],
+            documents=[chunk.page_content for _, chunk in batch],
+            metadatas=[chunk.metadata or {'source': ''} for _, chunk in batch])
+        self.embedded += len(batch)
+
+    def run(self, files, on_progress=None):
+        """Ingest the files, calling on_progress(stats) after every written batch"""
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.workers) as pool:
+            pending = {}
+            batches = self._batches(files)
+            while True:
+                read_start = time.perf_counter()
+                batch = next(batches, None)
+                self.read_seconds += time.perf_counter() - read_start
+                if batch is None:
+                    break
+                index_start = time.perf_counter()
+                batch = self._new(batch)
+                self.index_seconds += time.perf_counter() - index_start
+                if not batch:
+                    continue
+                pending[pool.submit(self._embed, [chunk.page_content for _, chunk in batch])] = batch
+                # reading ahead stops while the embedding workers are busy
+                while len(pending) >= 2 * self.workers:
+                    self._drain(pending, start, on_progress)
+            while pending:
+                self._drain(pending, start, on_progress)
+        self.seconds = time.perf_counter() - start
+        return self.stats()
+
+    # the vector store is only written from the calling thread
+    def _drain(self, pending, start, on_progress):
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            vectors = future.result()
+            index_start = time.perf_counter()
+            self._write(pending.pop(future), vectors)
+            self.index_seconds += time.perf_counter() - index_start
+        self.seconds = time.perf_counter() - start
+        if on_progress:
+            on_progress(self.stats())
+
+    def stats(self):
+        return {'pages': self.pages, 'chunks': self.chunks, 'duplicates': self.duplicates,
+                'already_stored': self.stored, 'embedded': self.embedded,
+                'retries': self.retries, 'seconds': self.seconds,
+                'load_seconds': self.load_seconds, 'split_seconds': self.read_seconds - self.load_seconds,
+                'embed_seconds': self.embed_seconds, 'index_seconds': self.index_seconds,
+                'chunks_per_second': self.embedded / self.seconds if self.seconds else 0.0}
+
+
+def ingest(files, embeddings, vector_store, on_progress=None, **kwargs):
+    pipeline = IngestionPipeline(embeddings, vector_store, **kwargs)
+    pipeline.run(files, on_progress)
+    return pipeline
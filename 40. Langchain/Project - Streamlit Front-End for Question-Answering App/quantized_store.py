@@ -0,0 +1,193 @@
+import os
+import json
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+
+# vector store holding int8 scalar-quantized vectors in a memory-mapped file
+# a query scans the int8 vectors (1 byte per dimension instead of 4) and then rescores the
+# best k * rescore_factor candidates exactly with their float32 vectors, which live in a
+# second memory-mapped file and are only read for those candidates
+# vectors are L2-normalized, so scores are cosine similarities; texts and metadata are in sqlite
+#
+# files in persist_directory:
+#   vectors.int8  n x dim int8      round(v / scale), scale = max|v| / 127 per vector
+#   scales.f32    n float32
+#   vectors.f32   n x dim float32
+#   documents.sqlite  row, id, text, metadata
+class QuantizedVectorStore(VectorStore):
+    def __init__(self, persist_directory, embedding_function, rescore_factor=10, block_rows=8192):
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        self.rescore_factor = rescore_factor
+        self.block_rows = block_rows  # int8 rows converted to float32 at a time while scanning
+        os.makedirs(persist_directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(persist_directory, 'documents.sqlite'), check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS documents '
+                         '(row INTEGER PRIMARY KEY, id TEXT UNIQUE, text TEXT, metadata TEXT)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)')
+        self._db.commit()
+        dim = self._db.execute("SELECT value FROM settings WHERE key = 'dim'").fetchone()
+        self.dim = int(dim[0]) if dim else None
+        self._maps = None
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    def _path(self, name):
+        return os.path.join(self.persist_directory, name)
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    # memory maps of the rows committed so far, reopened after every add
+    def _mapped(self):
+        n = len(self)
+        if self._maps is None or self._maps[0] != n:
+            if n == 0:
+                self._maps = (0, None, None, None)
+            else:
+                self._maps = (n,
+                              np.memmap(self._path('vectors.int8'), np.int8, 'r', shape=(n, self.dim)),
+                              np.memmap(self._path('scales.f32'), np.float32, 'r', shape=(n,)),
+                              np.memmap(self._path('vectors.f32'), np.float32, 'r', shape=(n, self.dim)))
+        return self._maps
+
+    @staticmethod
+    def quantize(vectors):
+        """(int8 vectors, float32 scales) of L2-normalized float32 vectors"""
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    @staticmethod
+    def _normalize(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _append(self, name, array, n):
+        # rows past the committed count are leftovers of an interrupted add and are overwritten
+        with open(self._path(name), 'ab') as f:
+            f.truncate(n * array[0].nbytes)
+            f.write(array.tobytes())
+
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None, **kwargs):
+        """Add (text, vector) pairs, ids that are already stored are skipped"""
+        text_embeddings = list(text_embeddings)
+        if not text_embeddings:
+            return []
+        texts = [text for text, _ in text_embeddings]
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [None] * len(texts)
+
+        with self._lock:
+            known = set(self._known(ids))
+            keep = [i for i, key in enumerate(ids) if key is None or key not in known]
+            if not keep:
+                return ids
+            vectors = self._normalize([text_embeddings[i][1] for i in keep])
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._db.execute("INSERT INTO settings VALUES ('dim', ?)", (str(self.dim),))
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f'Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}')
+
+            n = len(self)
+            quantized, scales = self.quantize(vectors)
+            self._append('vectors.int8', quantized, n)
+            self._append('scales.f32', scales, n)
+            self._append('vectors.f32', vectors, n)
+            rows = range(n, n + len(keep))
+            ids = [ids[i] if ids[i] is not None else str(row) for i, row in zip(keep, rows)]
+            self._db.executemany('INSERT INTO documents VALUES (?, ?, ?, ?)',
+                                 [(row, key, texts[i], json.dumps(metadatas[i]))
+                                  for row, key, i in zip(rows, ids, keep)])
+            self._db.commit()
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        vectors = self.embedding_function.embed_documents(texts)
+        return self.add_embeddings(zip(texts, vectors), metadatas, ids)
+
+    def _known(self, ids):
+        keys = [key for key in ids if key is not None]
+        found = []
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            found += [row[0] for row in self._db.execute(
+                'SELECT id FROM documents WHERE id IN ({})'.format(','.join('?' * len(part))), part)]
+        return found
+
+    def get_by_ids(self, ids, /):
+        return [document for _, document in self._documents_where('id', list(ids))]
+
+    def _documents_where(self, column, values):
+        found = {}
+        for start in range(0, len(values), 500):
+            part = values[start:start + 500]
+            rows = self._db.execute('SELECT row, id, text, metadata FROM documents WHERE {} IN ({})'.format(
+                column, ','.join('?' * len(part))), part)
+            for row, key, text, metadata in rows:
+                found[row if column == 'row' else key] = (row, Document(
+                    id=key, page_content=text, metadata=json.loads(metadata)))
+        return [found[value] for value in values if value in found]
+
+    def search_rows(self, query_vector, k=4):
+        """(rows, cosine similarities) of the k nearest vectors, best first"""
+        n, quantized, scales, vectors = self._mapped()
+        if n == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        query = self._normalize(query_vector)
+
+        # approximate scores from the int8 vectors, a block at a time
+        approximate = np.empty(n, dtype=np.float32)
+        for start in range(0, n, self.block_rows):
+            block = quantized[start:start + self.block_rows]
+            approximate[start:start + len(block)] = (block.astype(np.float32) @ query) * scales[start:start + len(block)]
+
+        candidates = min(n, k * self.rescore_factor)
+        rows = np.argpartition(-approximate, candidates - 1)[:candidates] if candidates < n else np.arange(n)
+        rows.sort()  # sequential reads from the float32 file
+        exact = vectors[rows] @ query
+        best = np.argsort(-exact)[:k]
+        return rows[best], exact[best]
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, **kwargs):
+        rows, similarities = self.search_rows(embedding, k)
+        documents = dict(self._documents_where('row', [int(row) for row in rows]))
+        # scores are cosine distances, like Chroma's cosine space
+        return [(documents[int(row)], float(1 - similarity)) for row, similarity in zip(rows, similarities)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        return self._cosine_relevance_score_fn
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, persist_directory='./quantized_db', **kwargs):
+        store = cls(persist_directory, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    def stats(self):
+        n = len(self)
+        dim = self.dim or 0
+        return {'vectors': n, 'dimensions': dim,
+                'scan_bytes': n * (dim + 4),  # int8 vectors and scales, read by every query
+                'float32_bytes': n * dim * 4}  # only the candidates' rows are read
@@ -0,0 +1,70 @@
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+# answers to earlier questions, looked up by meaning instead of exact text: a question whose
+# embedding has cosine similarity >= threshold with a cached question about the same document
+# set gets the cached answer and sources without retrieval or an LLM call
+# entries expire after ttl_seconds and the least recently used are evicted beyond max_entries
+class SemanticCache:
+    def __init__(self, embeddings, threshold=0.95, ttl_seconds=3600, max_entries=512):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _embed(self, question):
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now):
+        expired = [key for key, entry in self._entries.items() if now - entry['created'] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        self.expirations += len(expired)
+
+    def lookup(self, document_set, question):
+        """Cached entry (answer, sources, question, similarity) for a near-duplicate question, or None"""
+        vector = self._embed(question)
+        with self._lock:
+            self._expire(time.time())
+            keys = [key for key, entry in self._entries.items() if entry['document_set'] == document_set]
+            if keys:
+                similarities = np.stack([self._entries[key]['vector'] for key in keys]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    self._entries.move_to_end(keys[best])
+                    entry = self._entries[keys[best]]
+                    return {'answer': entry['answer'], 'sources': entry['sources'],
+                            'question': entry['question'], 'similarity': float(similarities[best])}
+            self.misses += 1
+            return None
+
+    def store(self, document_set, question, answer, sources=()):
+        vector = self._embed(question)
+        with self._lock:
+            self._entries[self._next_id] = {'document_set': document_set, 'vector': vector, 'question': question,
+                                            'answer': answer, 'sources': list(sources), 'created': time.time()}
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                    'entries': len(self._entries), 'evictions': self.evictions, 'expirations': self.expirations}
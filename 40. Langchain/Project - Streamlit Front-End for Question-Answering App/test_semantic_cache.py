@@ -0,0 +1,103 @@
+import pytest
+
+import semantic_cache
+from semantic_cache import SemanticCache
+from fakes import FakeEmbeddings, FakeChatModel
+from quantized_store import QuantizedVectorStore
+from chat_with_documents import build_chain, ask_with_cache
+
+# SemanticCache and ask_with_cache with the local stand-in embeddings and chat model
+# pytest test_semantic_cache.py
+
+QUESTION = 'How is the pump maintained?'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(semantic_cache.time, 'time', clock.time)
+    return clock
+
+
+def test_near_duplicate_question_is_a_hit():
+    cache = SemanticCache(FakeEmbeddings(256), threshold=0.9)
+    cache.store('manual', QUESTION, 'Every 500 hours.', ['page 3'])
+
+    hit = cache.lookup('manual', 'how is the pump maintained')
+
+    assert hit['answer'] == 'Every 500 hours.' and hit['sources'] == ['page 3']
+    assert hit['question'] == QUESTION and hit['similarity'] >= 0.9
+    assert cache.stats()['hits'] == 1
+
+
+def test_question_below_the_threshold_is_a_miss():
+    cache = SemanticCache(FakeEmbeddings(256), threshold=0.9)
+    cache.store('manual', QUESTION, 'Every 500 hours.')
+
+    assert cache.lookup('manual', 'How is the pump installed on the frame?') is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_other_document_set_is_a_miss():
+    cache = SemanticCache(FakeEmbeddings(256))
+    cache.store('manual', QUESTION, 'Every 500 hours.')
+
+    assert cache.lookup('other manual', QUESTION) is None
+    assert cache.lookup('manual', QUESTION) is not None
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = SemanticCache(FakeEmbeddings(256), ttl_seconds=60)
+    cache.store('manual', QUESTION, 'Every 500 hours.')
+
+    clock.now += 59
+    assert cache.lookup('manual', QUESTION) is not None
+    clock.now += 2
+    assert cache.lookup('manual', QUESTION) is None
+    assert cache.stats()['expirations'] == 1 and cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticCache(FakeEmbeddings(256), max_entries=2)
+    cache.store('manual', 'first question', 'one')
+    cache.store('manual', 'second question', 'two')
+    cache.lookup('manual', 'first question')  # the first entry is now the most recently used
+
+    cache.store('manual', 'third question', 'three')
+
+    assert cache.lookup('manual', 'second question') is None
+    assert cache.lookup('manual', 'first question')['answer'] == 'one'
+    assert cache.lookup('manual', 'third question')['answer'] == 'three'
+    assert cache.stats()['evictions'] == 1
+
+
+@pytest.fixture
+def vector_store(tmp_path):
+    store = QuantizedVectorStore(str(tmp_path / 'store'), FakeEmbeddings(256))
+    store.add_texts(['The pump is maintained every 500 hours.', 'Valves are checked weekly.'])
+    return store
+
+
+def test_follow_up_questions_bypass_the_cache(vector_store):
+    cache = SemanticCache(FakeEmbeddings(256))
+    cache.store(('manual', 3), 'What about the second one?', 'An answer from another conversation.')
+    llm = FakeChatModel()
+
+    # the first question of a conversation can be answered from the cache ...
+    chain = build_chain(vector_store, 3, llm, verbose=False)
+    cache.store(('manual', 3), QUESTION, 'Every 500 hours.')
+    answer, hit = ask_with_cache(vector_store, 'manual', QUESTION, 3, cache=cache, chain=chain)
+    assert hit and answer['answer'] == 'Every 500 hours.' and llm.calls == 0
+
+    # ... and is kept in its memory, so the follow-up goes through the chain
+    answer, hit = ask_with_cache(vector_store, 'manual', 'What about the second one?', 3, cache=cache, chain=chain)
+    assert hit is None and answer['answer'] != 'An answer from another conversation.'
+    assert llm.calls > 0